@@ -0,0 +1,75 @@
+"""
+Compares the vectorized event generation with the original iterrows loop.
+
+Run from the repo root:
+    python -m Benchmarks.bench_event_creator --years 3 --repeat 5
+"""
+import argparse
+import os
+import time
+import pandas as pd
+from Functions.schedule_cleaner import CFClassesDataCleaner
+from Functions.event_creator import create_events_with_duration, create_events_with_duration_iterrows
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INPUT_FILE_PATH = os.path.join(BASE_DIR, 'Data', 'OG_Schedule.xlsx')
+
+
+def load_schedule():
+    cleaner = CFClassesDataCleaner(INPUT_FILE_PATH)
+    cleaner.preserve_dates()
+    cleaner.load_data()
+    cleaner.set_date_as_header()
+    return cleaner.get_cf_classes_df_partial()
+
+
+def extend_schedule(df, years):
+    """
+    Appends copies of the sheet shifted by whole weeks so weekdays line up.
+    """
+    dates = [pd.Timestamp(col) for col in df.columns if "Week_Separator" not in col and col != 'Unnamed: 2']
+    span = pd.Timedelta(weeks=(dates[-1] - dates[0]).days // 7 + 1)
+
+    frames = [df]
+    for year in range(1, years):
+        shifted = df.drop(columns=['Unnamed: 2']).copy()
+        shifted.columns = [
+            f"{col}_{year}" if "Week_Separator" in col
+            else (pd.Timestamp(col) + span * year).strftime('%m/%d/%Y')
+            for col in shifted.columns
+        ]
+        frames.append(shifted)
+    return pd.concat(frames, axis=1)
+
+
+def time_it(func, df, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        events = func(df)
+        timings.append(time.perf_counter() - start)
+    return events, min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--years', type=int, default=1, help='Number of schedule years to generate events for')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per implementation, the best one is reported')
+    args = parser.parse_args()
+
+    df = extend_schedule(load_schedule(), args.years)
+
+    legacy_events, legacy_time = time_it(create_events_with_duration_iterrows, df, args.repeat)
+    events, vectorized_time = time_it(create_events_with_duration, df, args.repeat)
+
+    if events != legacy_events:
+        raise SystemExit("Vectorized output does not match the iterrows output")
+
+    print(f"Cells: {df.shape[0] * (df.shape[1] - 1)}, events: {len(events)}")
+    print(f"iterrows:   {legacy_time * 1000:.1f} ms")
+    print(f"vectorized: {vectorized_time * 1000:.1f} ms")
+    print(f"speedup:    {legacy_time / vectorized_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Compares the per-call cost of the logger with the previous implementation,
+which looked up the caller with inspect.stack(), detached the console
+handler for silent messages and wrote to the handlers inline.
+
+Run from the repo root:
+    python -m Benchmarks.bench_logger --calls 2000 --depth 20
+"""
+import argparse
+import inspect
+import logging
+import os
+import tempfile
+import time
+import colorlog
+from logger import Logger
+
+
+class LegacyLogger:
+    """
+    Copy of the logger before the rewrite, kept for comparison.
+    """
+    def __init__(self, logger_name, file_name):
+        self.logger = logging.getLogger(logger_name)
+        self.logger.setLevel(logging.DEBUG)
+
+        formatter = colorlog.ColoredFormatter(
+            '%(asctime)s - %(name)s - %(log_color)s%(levelname)s%(reset)s - [%(module)s:%(funcName)s] - %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S',
+        )
+
+        self.file_handler = logging.FileHandler(file_name, encoding='utf-8')
+        self.file_handler.setLevel(logging.DEBUG)
+        self.file_handler.setFormatter(formatter)
+        self.logger.addHandler(self.file_handler)
+
+        self.console_handler = logging.StreamHandler()
+        self.console_handler.setLevel(logging.DEBUG)
+        self.console_handler.setFormatter(formatter)
+        self.logger.addHandler(self.console_handler)
+
+    def _get_caller_info(self):
+        stack = inspect.stack()
+        frame = stack[3]
+        module = inspect.getmodule(frame[0])
+        module_name = "" if module is None else module.__name__
+        func_name = frame.function
+        return module_name, func_name
+
+    def _log(self, level, message, silent=False):
+        module_name, func_name = self._get_caller_info()
+        if silent:
+            self.logger.removeHandler(self.console_handler)
+        record = self.logger.makeRecord(self.logger.name, level, module_name, 0, message, None, None, func_name)
+        self.logger.handle(record)
+        if silent:
+            self.logger.addHandler(self.console_handler)
+
+    def log_info(self, message, silent=False):
+        self._log(logging.INFO, message, silent)
+
+
+def nested(depth, func):
+    """
+    Calls func from depth frames down, like a log call inside a request handler.
+    """
+    if depth <= 0:
+        return func()
+    return nested(depth - 1, func)
+
+
+def time_calls(logger, calls, depth, silent):
+    def log_many():
+        start = time.perf_counter()
+        for i in range(calls):
+            logger.log_info(f"[+] Benchmark message {i}", silent=silent)
+        return time.perf_counter() - start
+    return nested(depth, log_many)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=2000, help='Log calls per measurement')
+    parser.add_argument('--depth', type=int, default=20, help='Stack depth the calls are made from')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir, open(os.devnull, 'w') as devnull:
+        loggers = {
+            "legacy": LegacyLogger("bench_legacy", os.path.join(tmp_dir, 'legacy.log')),
+            "current": Logger("bench_current", os.path.join(tmp_dir, 'current.log')),
+        }
+        for logger in loggers.values():
+            logger.console_handler.setStream(devnull)
+        loggers["current"].start()
+
+        print(f"{'logger':<10}{'silent':>8}{'us/call':>12}")
+        results = {}
+        for silent in (False, True):
+            for name, logger in loggers.items():
+                elapsed = time_calls(logger, args.calls, args.depth, silent)
+                results[(name, silent)] = elapsed
+                print(f"{name:<10}{str(silent):>8}{elapsed / args.calls * 1e6:>12.1f}")
+        for silent in (False, True):
+            print(f"speedup (silent={silent}): {results[('legacy', silent)] / results[('current', silent)]:.1f}x")
+
+        loggers["current"].stop()  # Drain the queue before closing the files
+        for logger in loggers.values():
+            logger.file_handler.close()
+
+
+if __name__ == '__main__':
+    main()
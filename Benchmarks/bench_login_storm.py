@@ -0,0 +1,101 @@
+"""
+Measures the latency of a cheap endpoint while a storm of logins runs, with
+bcrypt verification inline on the event loop vs on the password service.
+
+Run from the repo root:
+    python -m Benchmarks.bench_login_storm --logins 20 --duration 5
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+from fastapi import FastAPI
+from password_service import PasswordService, pwd_context
+
+PROBE_INTERVAL = 0.01
+
+
+def build_app(service, hashed_password):
+    app = FastAPI()
+
+    @app.post("/signin-blocking")
+    async def signin_blocking():
+        return {"ok": pwd_context.verify("abc123", hashed_password)}
+
+    @app.post("/signin")
+    async def signin():
+        return {"ok": await service.verify("abc123", hashed_password)}
+
+    @app.get("/ping")
+    async def ping():
+        return {"pong": True}
+
+    return app
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run_storm(client, login_path, logins, duration):
+    deadline = time.perf_counter() + duration
+    login_count = 0
+
+    async def login_loop():
+        nonlocal login_count
+        while time.perf_counter() < deadline:
+            response = await client.post(login_path)
+            if response.status_code == 200:
+                login_count += 1
+
+    async def probe_loop():
+        # Latency is measured from when each probe was due, so time the loop
+        # spent blocked before sending it counts too
+        latencies = []
+        started = time.perf_counter()
+        probe = 0
+        while time.perf_counter() < deadline:
+            due = started + probe * PROBE_INTERVAL
+            await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            await client.get("/ping")
+            latencies.append(time.perf_counter() - due)
+            probe += 1
+        return latencies
+
+    results = await asyncio.gather(probe_loop(), *[login_loop() for _ in range(logins if login_path else 0)])
+    return results[0], login_count
+
+
+async def main_async(args):
+    hashed_password = pwd_context.hash("abc123")
+    service = PasswordService(max_workers=args.workers, max_queue=args.logins)
+    app = build_app(service, hashed_password)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"{'scenario':<16}{'logins/s':>10}{'ping p50 ms':>14}{'ping p99 ms':>14}{'ping max ms':>14}")
+        for name, login_path in (("idle", None), ("blocking", "/signin-blocking"), ("service", "/signin")):
+            latencies, login_count = await run_storm(client, login_path, args.logins, args.duration)
+            print(
+                f"{name:<16}{login_count / args.duration:>10.1f}"
+                f"{statistics.median(latencies) * 1000:>14.1f}"
+                f"{percentile(latencies, 99) * 1000:>14.1f}"
+                f"{max(latencies) * 1000:>14.1f}"
+            )
+    print(f"password service: {service.stats()}")
+    service.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--logins', type=int, default=20, help='Concurrent clients signing in')
+    parser.add_argument('--duration', type=float, default=5, help='Seconds per scenario')
+    parser.add_argument('--workers', type=int, default=4, help='Password service threads')
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,314 @@
+"""
+Seeds a MongoDB database with realistic data and load tests the API with
+concurrent httpx clients, reporting throughput and latency percentiles per
+endpoint as JSON so runs can be compared over time.
+
+The seed has --coaches coaches, a year of events from Data/OG_Schedule.xlsx
+(shifted by whole weeks so the year covers today) and --comments comments.
+
+By default the app runs in-process (ASGI transport, lifespan run manually)
+against LOAD_TEST_MONGODB_URI. --base-url drives a running server instead,
+which must use the same database. --mongomock swaps MongoDB for mongomock-motor
+when no server is available (no change streams or command monitoring).
+
+Run from the repo root:
+    python -m Benchmarks.load_test --requests 500 --concurrency 20 --output Benchmarks/results.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import subprocess
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from dotenv import load_dotenv
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEDULE_PATH = os.path.join(BASE_DIR, 'Data', 'OG_Schedule.xlsx')
+LOAD_TEST_PASSWORD = "loadtest-password"
+SEEDED_COLLECTIONS = ("users", "events", "comments", "tokens")
+LOAD_TEST_ENV_DEFAULTS = {
+    "ACCESS_TOKEN_SECRET": "loadtest-access-secret",
+    "REFRESH_TOKEN_SECRET": "loadtest-refresh-secret",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "60",
+    "REFRESH_TOKEN_EXPIRE_DAYS": "7",
+}
+SCENARIOS = ("signin", "events-for-month", "events-in-range", "comments", "weekly-hours")
+
+
+def percentile(sorted_samples, pct):
+    if not sorted_samples:
+        return None
+    return sorted_samples[min(len(sorted_samples) - 1, int(len(sorted_samples) * pct / 100))]
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def shifted_schedule_events():
+    """
+    Events of the schedule workbook shifted by whole weeks so their year spans today.
+    """
+    from Functions.schedule_importer import parse_schedule
+
+    events, _ = parse_schedule(SCHEDULE_PATH)
+    first, last = events[0]['start'], events[-1]['start']
+    midpoint = first + (last - first) / 2
+    shift = timedelta(weeks=round((datetime.utcnow() - midpoint).days / 7))
+    for event in events:
+        event['start'] += shift
+        event['end'] += shift
+    return events
+
+
+async def seed(db, coach_count, comment_count):
+    from password_service import pwd_context
+
+    start = time.perf_counter()
+    for name in SEEDED_COLLECTIONS:
+        await db[name].delete_many({})
+
+    # One hash for everybody, hashing hundreds of passwords would dominate the seed
+    hashed_password = pwd_context.hash(LOAD_TEST_PASSWORD)
+    coaches = [{
+        "_id": ObjectId(),
+        "email": f"coach{i}@loadtest.local",
+        "first_name": f"Coach{i}",
+        "last_name": "Loadtest",
+        "hashed_password": hashed_password,
+        "type": "coach",
+        "disabled": False,
+        "welcomed": True,
+        "isActive": False,
+    } for i in range(coach_count)]
+    await db.users.insert_many(coaches)
+
+    # Give each schedule title its own coach so per-coach queries return real data
+    events = shifted_schedule_events()
+    title_coaches = {}
+    for event in events:
+        coach = title_coaches.setdefault(event['title'], coaches[len(title_coaches) % len(coaches)])
+        event['coach_id'] = str(coach['_id'])
+    await db.events.insert_many(events)
+
+    first_day, last_day = events[0]['start'], events[-1]['start']
+    span_seconds = (last_day - first_day).total_seconds()
+    rng = random.Random(42)
+    comments = [{
+        "text": f"Load test comment {i}",
+        "coach_id": str(rng.choice(coaches)['_id']),
+        "date": first_day + timedelta(seconds=rng.uniform(0, span_seconds)),
+    } for i in range(comment_count)]
+    if comments:
+        await db.comments.insert_many(comments)
+
+    return {
+        "coaches": len(coaches),
+        "events": len(events),
+        "comments": len(comments),
+        "first_event": first_day.isoformat(),
+        "last_event": last_day.isoformat(),
+        "seconds": round(time.perf_counter() - start, 3),
+        "coach_emails": [coach['email'] for coach in coaches],
+        "busy_coach_emails": [coach['email'] for coach in title_coaches.values()],
+    }
+
+
+async def sign_in(client, email):
+    return await client.post("/api/auth/signin", data={"username": email, "password": LOAD_TEST_PASSWORD})
+
+
+def build_requests(name, client, rng, tokens, emails, seed_info):
+    """
+    Returns a coroutine factory issuing one request of the scenario.
+    """
+    first_event = datetime.fromisoformat(seed_info['first_event'])
+    last_event = datetime.fromisoformat(seed_info['last_event'])
+
+    def auth_headers():
+        return {"Authorization": f"Bearer {rng.choice(tokens)}"}
+
+    def random_day():
+        return first_event + timedelta(days=rng.randrange(max(1, (last_event - first_event).days)))
+
+    if name == "signin":
+        return lambda: sign_in(client, rng.choice(emails))
+    if name == "events-for-month":
+        def events_for_month():
+            day = random_day()
+            return client.get("/api/events/events-for-month", params={"month": day.month, "year": day.year})
+        return events_for_month
+    if name == "events-in-range":
+        def events_in_range():
+            day = random_day()
+            params = {"start_date": day.strftime("%m/%d/%Y"), "end_date": (day + timedelta(days=6)).strftime("%m/%d/%Y")}
+            return client.get("/api/events/events-in-range", params=params, headers=auth_headers())
+        return events_in_range
+    if name == "comments":
+        return lambda: client.get("/api/comments", params={"limit": 100}, headers=auth_headers())
+    if name == "weekly-hours":
+        return lambda: client.get("/api/events/weekly-hours", headers=auth_headers())
+    raise ValueError(f"Unknown scenario {name}")
+
+
+async def run_scenario(make_request, total_requests, concurrency):
+    latencies = []
+    errors = {}
+    remaining = total_requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                response = await make_request()
+                status = response.status_code
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors[str(status)] = errors.get(str(status), 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+
+    ordered = sorted(latencies)
+    to_ms = lambda seconds: round(seconds * 1000, 2) if seconds is not None else None
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "mean_ms": to_ms(statistics.fmean(ordered)) if ordered else None,
+        "p50_ms": to_ms(percentile(ordered, 50)),
+        "p95_ms": to_ms(percentile(ordered, 95)),
+        "p99_ms": to_ms(percentile(ordered, 99)),
+        "max_ms": to_ms(ordered[-1] if ordered else None),
+    }
+
+
+async def drive(client, args, seed_info):
+    rng = random.Random(args.seed)
+    busy_emails = seed_info['busy_coach_emails'][:args.users]
+    tokens = []
+    for email in busy_emails:
+        response = await sign_in(client, email)
+        response.raise_for_status()
+        tokens.append(response.json()["access_token"])
+
+    results = {}
+    for name in args.scenarios:
+        make_request = build_requests(name, client, rng, tokens, seed_info['coach_emails'], seed_info)
+        total = args.signin_requests if name == "signin" else args.requests
+        await run_scenario(make_request, min(args.warmup, total), args.concurrency)
+        results[name] = await run_scenario(make_request, total, args.concurrency)
+        print(f"{name:<18} {results[name]['throughput_rps']:>8} req/s  p50 {results[name]['p50_ms']} ms  "
+              f"p95 {results[name]['p95_ms']} ms  p99 {results[name]['p99_ms']} ms  errors {results[name]['errors']}")
+    return results
+
+
+async def main_async(args):
+    import httpx
+
+    os.environ['MONGODB_URI'] = args.uri
+    os.environ['MONGODB_DB_NAME'] = args.db_name
+    # The token settings of .env win, these only let the suite run without one
+    load_dotenv()
+    for name, value in LOAD_TEST_ENV_DEFAULTS.items():
+        os.environ.setdefault(name, value)
+
+    if args.mongomock:
+        from mongomock_motor import AsyncMongoMockClient
+        import db as db_module
+
+        mock_client = AsyncMongoMockClient()
+        # The app's lifespan builds its own client, hand it the shared in-memory one
+        db_module.AsyncIOMotorClient = lambda *client_args, **client_kwargs: mock_client
+        seed_client = mock_client
+    else:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        seed_client = AsyncIOMotorClient(args.uri)
+
+    from logger import coach_logger
+    if not args.verbose:
+        coach_logger.console_handler.setLevel(logging.WARNING)
+
+    seed_info = await seed(seed_client[args.db_name], args.coaches, args.comments)
+    print(f"Seeded {seed_info['coaches']} coaches, {seed_info['events']} events and {seed_info['comments']} comments in {seed_info['seconds']}s")
+
+    if args.base_url:
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout) as client:
+            results = await drive(client, args, seed_info)
+    else:
+        from app import app
+        from db import lifespan
+
+        async with lifespan(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=args.timeout) as client:
+                results = await drive(client, args, seed_info)
+
+    if not args.mongomock:
+        seed_client.close()
+
+    return {
+        "timestamp": datetime.utcnow().isoformat(timespec='seconds') + "Z",
+        "commit": git_commit(),
+        "target": args.base_url or ("in-process (mongomock)" if args.mongomock else "in-process"),
+        "config": {
+            "coaches": args.coaches,
+            "comments": args.comments,
+            "requests": args.requests,
+            "signin_requests": args.signin_requests,
+            "concurrency": args.concurrency,
+            "users": args.users,
+        },
+        "seed": {key: value for key, value in seed_info.items() if key not in ("coach_emails", "busy_coach_emails")},
+        "scenarios": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uri', default=os.getenv('LOAD_TEST_MONGODB_URI', 'mongodb://localhost:27017/'), help='MongoDB to seed and run against')
+    parser.add_argument('--db-name', default=os.getenv('LOAD_TEST_MONGODB_DB_NAME', 'coach-box-loadtest'), help='Database to seed, its users, events, comments and tokens are replaced')
+    parser.add_argument('--mongomock', action='store_true', help='Use mongomock-motor instead of a MongoDB server')
+    parser.add_argument('--base-url', help='Drive a running server instead of the in-process app')
+    parser.add_argument('--coaches', type=int, default=300)
+    parser.add_argument('--comments', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=500, help='Requests per scenario')
+    parser.add_argument('--signin-requests', type=int, default=50, help='Requests for the signin scenario, each one runs bcrypt')
+    parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests before each scenario')
+    parser.add_argument('--concurrency', type=int, default=20, help='Concurrent clients')
+    parser.add_argument('--users', type=int, default=5, help='Coaches signed in to drive the authenticated endpoints')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for request parameters')
+    parser.add_argument('--output', help='Also write the JSON report to this file')
+    parser.add_argument('--verbose', action='store_true', help='Keep the app console logging')
+    parser.add_argument('--force', action='store_true', help='Allow seeding a database whose name does not contain loadtest')
+    args = parser.parse_args()
+
+    if 'loadtest' not in args.db_name and not args.force:
+        parser.error(f"Refusing to replace the data of {args.db_name}, use a database with loadtest in its name or --force")
+
+    report = asyncio.run(main_async(args))
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+
+
+if __name__ == '__main__':
+    main()
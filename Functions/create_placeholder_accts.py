@@ -1,41 +1,50 @@
-import sys
-sys.path.append('C:/Users/carte/OneDrive/Documents/Code/Coach Box/backend/')
+"""
+Creates the placeholder coach accounts used for development.
 
+Run from the repo root:
+    python -m Functions.create_placeholder_accts
+"""
 from motor.motor_asyncio import AsyncIOMotorClient
-from auth import get_password_hash  # Replace with your actual import
+from db import MONGODB_URI
+from Functions.provision_users import provision_users
+from logger import coach_logger
 import asyncio
 
+PLACEHOLDER_PASSWORD = "abc123"
+# The placeholder accounts have always lived here, not in the app's MONGODB_DB_NAME
+PLACEHOLDER_DB_NAME = "coach-box-db"
+
 async def create_placeholder_coaches():
     # Open a new database connection
-    mongodb_client = AsyncIOMotorClient("mongodb+srv://cjames:<creds>@cluster0.hxjsezh.mongodb.net/")
-    db = mongodb_client.get_database("coach-box-db")  # Replace with your actual database name
-    coaches_collection = db.get_collection("users")  # Replace with your actual collection name
+    mongodb_client = AsyncIOMotorClient(MONGODB_URI)
+    db = mongodb_client.get_database(PLACEHOLDER_DB_NAME)
 
-    # Your placeholder coaches data remains the same
     placeholder_coaches = [
-        {"first_name": "Carter", "last_name": "James", "email": "cj@gmail.com", "hashed_password": get_password_hash("abc123"), "type": "coach"},
-        {"first_name": "Doza", "last_name": "Doe", "email": "doza@gmail.com", "hashed_password": get_password_hash("abc123"), "type": "coach"},
-        {"first_name": "Laurie", "last_name": "Doe", "email": "laurie@gmail.com", "hashed_password": get_password_hash("abc123"), "type": "coach"},
-        {"first_name": "Jonathan", "last_name": "Doe", "email": "jonathan@gmail.com", "hashed_password": get_password_hash("abc123"), "type": "coach"},
-        {"first_name": "Tom", "last_name": "Doe", "email": "tom@gmail.com", "hashed_password": get_password_hash("abc123"), "type": "coach"},
-        {"first_name": "Ashlyn", "last_name": "Doe", "email": "ashlyn@gmail.com", "hashed_password": get_password_hash("abc123"), "type": "coach"},
-        {"first_name": "Janet", "last_name": "Doe", "email": "janet@gmail.com", "hashed_password": get_password_hash("abc123"), "type": "coach"},
-        {"first_name": "Marni", "last_name": "Doe", "email": "marni@gmail.com", "hashed_password": get_password_hash("abc123"), "type": "coach"},
-        {"first_name": "Nick", "last_name": "Doe", "email": "nick@gmail.com", "hashed_password": get_password_hash("abc123"), "type": "coach"},
-        {"first_name": "Aly", "last_name": "Doe", "email": "aly@gmail.com", "hashed_password": get_password_hash("abc123"), "type": "coach"},
-        {"first_name": "Mirka", "last_name": "Doe", "email": "mirka@gmail.com", "hashed_password": get_password_hash("abc123"), "type": "coach"},
-        {"first_name": "Jay", "last_name": "Doe", "email": "jay@gmail.com", "hashed_password": get_password_hash("abc123"), "type": "coach"},
-        {"first_name": "Craig", "last_name": "Doe", "email": "craig@gmail.com", "hashed_password": get_password_hash("abc123"), "type": "coach"},
-        {"first_name": "Seth", "last_name": "Doe", "email": "seth@gmail.com", "hashed_password": get_password_hash("abc123"), "type": "coach"},
-        {"first_name": "Jana", "last_name": "Doe", "email": "jana@gmail.com", "hashed_password": get_password_hash("abc123"), "type": "coach"},
-        {"first_name": "Chris", "last_name": "Doe", "email": "chris@gmail.com", "hashed_password": get_password_hash("abc123"), "type": "coach"},
-        {"first_name": "Brandon", "last_name": "Doe", "email": "brandon@gmail.com", "hashed_password": get_password_hash("abc123"), "type": "coach"},
-        {"first_name": "Todd", "last_name": "Doe", "email": "todd@gmail.com", "hashed_password": get_password_hash("abc123"), "type": "coach"},
-        {"first_name": "Matt", "last_name": "Doe", "email": "matt@gmail.com", "hashed_password": get_password_hash("abc123"), "type": "coach"},
-        {"first_name": "Jacob", "last_name": "Doe", "email": "jacob@gmail.com", "hashed_password": get_password_hash("abc123"), "type": "coach"},
+        {"first_name": "Carter", "last_name": "James", "email": "cj@gmail.com", "password": PLACEHOLDER_PASSWORD, "type": "coach"},
+        {"first_name": "Doza", "last_name": "Doe", "email": "doza@gmail.com", "password": PLACEHOLDER_PASSWORD, "type": "coach"},
+        {"first_name": "Laurie", "last_name": "Doe", "email": "laurie@gmail.com", "password": PLACEHOLDER_PASSWORD, "type": "coach"},
+        {"first_name": "Jonathan", "last_name": "Doe", "email": "jonathan@gmail.com", "password": PLACEHOLDER_PASSWORD, "type": "coach"},
+        {"first_name": "Tom", "last_name": "Doe", "email": "tom@gmail.com", "password": PLACEHOLDER_PASSWORD, "type": "coach"},
+        {"first_name": "Ashlyn", "last_name": "Doe", "email": "ashlyn@gmail.com", "password": PLACEHOLDER_PASSWORD, "type": "coach"},
+        {"first_name": "Janet", "last_name": "Doe", "email": "janet@gmail.com", "password": PLACEHOLDER_PASSWORD, "type": "coach"},
+        {"first_name": "Marni", "last_name": "Doe", "email": "marni@gmail.com", "password": PLACEHOLDER_PASSWORD, "type": "coach"},
+        {"first_name": "Nick", "last_name": "Doe", "email": "nick@gmail.com", "password": PLACEHOLDER_PASSWORD, "type": "coach"},
+        {"first_name": "Aly", "last_name": "Doe", "email": "aly@gmail.com", "password": PLACEHOLDER_PASSWORD, "type": "coach"},
+        {"first_name": "Mirka", "last_name": "Doe", "email": "mirka@gmail.com", "password": PLACEHOLDER_PASSWORD, "type": "coach"},
+        {"first_name": "Jay", "last_name": "Doe", "email": "jay@gmail.com", "password": PLACEHOLDER_PASSWORD, "type": "coach"},
+        {"first_name": "Craig", "last_name": "Doe", "email": "craig@gmail.com", "password": PLACEHOLDER_PASSWORD, "type": "coach"},
+        {"first_name": "Seth", "last_name": "Doe", "email": "seth@gmail.com", "password": PLACEHOLDER_PASSWORD, "type": "coach"},
+        {"first_name": "Jana", "last_name": "Doe", "email": "jana@gmail.com", "password": PLACEHOLDER_PASSWORD, "type": "coach"},
+        {"first_name": "Chris", "last_name": "Doe", "email": "chris@gmail.com", "password": PLACEHOLDER_PASSWORD, "type": "coach"},
+        {"first_name": "Brandon", "last_name": "Doe", "email": "brandon@gmail.com", "password": PLACEHOLDER_PASSWORD, "type": "coach"},
+        {"first_name": "Todd", "last_name": "Doe", "email": "todd@gmail.com", "password": PLACEHOLDER_PASSWORD, "type": "coach"},
+        {"first_name": "Matt", "last_name": "Doe", "email": "matt@gmail.com", "password": PLACEHOLDER_PASSWORD, "type": "coach"},
+        {"first_name": "Jacob", "last_name": "Doe", "email": "jacob@gmail.com", "password": PLACEHOLDER_PASSWORD, "type": "coach"},
     ]
 
-    await coaches_collection.insert_many(placeholder_coaches)
+    # Upserts by email, so running it again does not duplicate the coaches
+    report = await provision_users(db, placeholder_coaches)
+    print(f"Created {report['inserted']} placeholder coaches in {report['seconds']:.2f}s")
 
     # Close the database connection
     mongodb_client.close()
@@ -44,4 +53,5 @@ async def create_placeholder_coaches():
 # You can run this in a script or in an initialization block of your application
 
 if __name__ == "__main__":
+    coach_logger.start()
     asyncio.run(create_placeholder_coaches())
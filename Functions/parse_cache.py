@@ -0,0 +1,96 @@
+import hashlib
+import os
+import time
+import pandas as pd
+from dotenv import load_dotenv
+from logger import coach_logger
+
+load_dotenv()
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'Data', 'Output', 'parse_cache')
+# Bump when the cleaning logic changes so old entries stop matching
+CACHE_VERSION = 1
+
+
+class ParseCache:
+    """
+    Stores cleaned schedule frames on disk keyed by a hash of the workbook bytes.
+
+    Entries are pickled frames. The cache is trimmed to max_bytes, least recently
+    used first, and entries older than max_age_seconds are dropped.
+    """
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=50 * 1024 * 1024, max_age_seconds=30 * 24 * 3600):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+
+    @staticmethod
+    def key_for(file_path):
+        digest = hashlib.sha256(f"v{CACHE_VERSION}:".encode())
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def load(self, key):
+        path = self._path(key)
+        try:
+            df = pd.read_pickle(path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            coach_logger.log_warning(f"[!] Dropping unreadable parse cache entry {key}: {e}")
+            self._remove(path)
+            return None
+        os.utime(path)  # Mark as recently used
+        return df
+
+    def store(self, key, df):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, path)  # Atomic, concurrent readers never see a partial file
+        self.evict()
+
+    def evict(self):
+        try:
+            names = [name for name in os.listdir(self.cache_dir) if name.endswith('.pkl')]
+        except FileNotFoundError:
+            return
+
+        now = time.time()
+        entries = []
+        for name in names:
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime > self.max_age_seconds:
+                self._remove(path)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            self._remove(path)
+            total_bytes -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+parse_cache = ParseCache(
+    max_bytes=int(os.getenv('PARSE_CACHE_MAX_BYTES', 50 * 1024 * 1024)),
+    max_age_seconds=int(os.getenv('PARSE_CACHE_MAX_AGE_SECONDS', 30 * 24 * 3600)),
+)
@@ -0,0 +1,160 @@
+"""
+Bulk provisions users from a CSV or JSONL file.
+
+Each record needs email, first_name, last_name and password, and may set type
+(coach or admin, default coach) and image_url. Other columns are ignored, so a
+roster can not set privileges or status fields. Users are upserted by email.
+The passwords of existing users are only replaced with --reset-passwords.
+
+Run from the repo root:
+    python -m Functions.provision_users roster.csv --batch-size 500 --workers 8
+"""
+import argparse
+import asyncio
+import csv
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from logger import coach_logger
+from password_service import pwd_context
+
+REQUIRED_FIELDS = ('email', 'first_name', 'last_name', 'password')
+# The only fields a roster may set on the user document
+PROFILE_FIELDS = ('first_name', 'last_name', 'type', 'image_url')
+USER_TYPES = ('coach', 'admin')
+DEFAULT_BATCH_SIZE = 500
+
+
+def load_users(file_path):
+    """
+    Reads and validates the user records of a .csv or .jsonl file.
+    """
+    with open(file_path, newline='', encoding='utf-8') as f:
+        if file_path.endswith('.csv'):
+            records = list(csv.DictReader(f))
+        elif file_path.endswith(('.jsonl', '.ndjson')):
+            records = [json.loads(line) for line in f if line.strip()]
+        else:
+            raise ValueError(f"Unsupported user file {file_path}, expected .csv or .jsonl")
+
+    users = []
+    ignored = set()
+    for line_number, record in enumerate(records, start=1):
+        user = {key: str(value).strip() for key, value in record.items() if key and value is not None}
+        ignored.update(key for key in user if key not in ('email', 'password', *PROFILE_FIELDS))
+        missing = [field for field in REQUIRED_FIELDS if not user.get(field)]
+        if missing:
+            raise ValueError(f"Record {line_number} is missing {', '.join(missing)}")
+        user['type'] = user.get('type', 'coach').lower()
+        if user['type'] not in USER_TYPES:
+            raise ValueError(f"Record {line_number} has unknown type {user['type']}")
+        users.append(user)
+    if ignored:
+        coach_logger.log_warning(f"[!] Ignoring unknown user fields: {', '.join(sorted(ignored))}")
+    return users
+
+
+def hash_password(password):
+    # Module level so the process pool can pickle it
+    return pwd_context.hash(password)
+
+
+def build_user_update(user, hashed_password, reset_password=False):
+    """
+    The update upserting the user: its whitelisted profile fields, and the defaults of new users.
+    """
+    profile = {key: user[key] for key in PROFILE_FIELDS if user.get(key)}
+    on_insert = {"disabled": False, "isActive": False, "welcomed": False}
+    if hashed_password is not None:
+        (profile if reset_password else on_insert)['hashed_password'] = hashed_password
+    return {"$set": profile, "$setOnInsert": on_insert}
+
+
+def build_upsert(user, hashed_password, reset_password=False):
+    return UpdateOne({"email": user['email']}, build_user_update(user, hashed_password, reset_password), upsert=True)
+
+
+async def provision_users(db, users, batch_size=DEFAULT_BATCH_SIZE, workers=None, reset_passwords=False):
+    """
+    Hashes the passwords across a process pool and upserts the users in
+    batches of batch_size. A batch is written as soon as its hashes are done,
+    while later batches are still hashing. Existing users keep their password
+    unless reset_passwords, so theirs are not hashed. Returns the counts and timings.
+    """
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    counts = {"users": len(users), "inserted": 0, "updated": 0, "unchanged": 0}
+    write_seconds = 0.0
+
+    existing_emails = set()
+    if not reset_passwords:
+        cursor = db.users.find({"email": {"$in": [user['email'] for user in users]}}, {"email": 1})
+        existing_emails = {doc['email'] async for doc in cursor}
+
+    # spawn, like job_manager, so workers do not inherit the event loop or Motor client
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        hash_futures = [
+            loop.run_in_executor(executor, hash_password, user['password']) if user['email'] not in existing_emails else None
+            for user in users
+        ]
+
+        for offset in range(0, len(users), batch_size):
+            batch = users[offset:offset + batch_size]
+            hashes = [await future if future is not None else None for future in hash_futures[offset:offset + batch_size]]
+            operations = [build_upsert(user, hashed, reset_passwords) for user, hashed in zip(batch, hashes)]
+
+            write_start = time.perf_counter()
+            result = await db.users.bulk_write(operations, ordered=False)
+            write_seconds += time.perf_counter() - write_start
+
+            counts["inserted"] += result.upserted_count
+            counts["updated"] += result.modified_count
+            counts["unchanged"] += result.matched_count - result.modified_count
+            coach_logger.log_info(f"[+] Provisioned {offset + len(batch)}/{len(users)} users")
+
+    elapsed = time.perf_counter() - start
+    return {
+        **counts,
+        "seconds": elapsed,
+        "write_seconds": write_seconds,
+        "users_per_second": len(users) / elapsed if elapsed else 0.0,
+    }
+
+
+async def main_async(args):
+    from db import MONGODB_URI, MONGODB_DB_NAME
+
+    users = load_users(args.file_path)
+    mongodb_client = AsyncIOMotorClient(args.uri or MONGODB_URI)
+    try:
+        db = mongodb_client.get_database(args.db_name or MONGODB_DB_NAME)
+        report = await provision_users(db, users, args.batch_size, args.workers, args.reset_passwords)
+    finally:
+        mongodb_client.close()
+
+    print(
+        f"Provisioned {report['users']} users in {report['seconds']:.2f}s "
+        f"({report['users_per_second']:.1f} users/s, {report['write_seconds']:.2f}s writing): "
+        f"{report['inserted']} inserted, {report['updated']} updated, {report['unchanged']} unchanged"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('file_path', help='CSV or JSONL file of users')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Users per bulk write')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Password hashing processes')
+    parser.add_argument('--reset-passwords', action='store_true', help='Also replace the password of existing users')
+    parser.add_argument('--uri', help='MongoDB URI, defaults to MONGODB_URI')
+    parser.add_argument('--db-name', help='Database name, defaults to MONGODB_DB_NAME')
+    args = parser.parse_args()
+    coach_logger.start()
+    asyncio.run(main_async(args))
+
+
+if __name__ == '__main__':
+    main()
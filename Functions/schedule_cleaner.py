@@ -1,7 +1,6 @@
 import pandas as pd
 import numpy as np
 from openpyxl import load_workbook
-from openpyxl import Workbook
 from dotenv import load_dotenv
 from logger import coach_logger
 import os
@@ -9,47 +8,59 @@ import os
 load_dotenv()
 
 class CFClassesDataCleaner:
-    def __init__(self, orginal_input_file_path, date_preserved_file_path):
+    # Rows of the sheet (as read into the frame) that hold the class time slots
+    CLASS_ROWS = slice(6, 21)
+
+    def __init__(self, orginal_input_file_path, date_preserved_file_path=None):
         self.output_path = orginal_input_file_path
         self.date_preserved_file_path = date_preserved_file_path
+        self.sheet_df = None
         self.date_row = None
         self.time_column = None
         self.cf_classes_df_partial = None
 
     def preserve_dates(self, sheet_name='CF Classes', date_row_marker='Date ->'):
+        """
+        Streams the sheet once in read-only mode using the cached cell values and
+        keeps the rows in memory as a frame shaped like pd.read_excel's output.
+
+        Reading stops as soon as the date row and the class rows have been seen.
+        """
         coach_logger.log_info(f'[+] Pre Cleaning {os.path.basename(self.output_path)}...')
-        original_wb_with_formula = load_workbook(self.output_path, data_only=False)
-        original_ws_with_formula = original_wb_with_formula[sheet_name]
-        
-        original_wb_with_values = load_workbook(self.output_path, data_only=True)
-        original_ws_with_values = original_wb_with_values[sheet_name]
-        
-        new_wb = Workbook()
-        new_ws = new_wb.active
-        new_ws.title = sheet_name
-
-        date_row_index = None
-
-        for idx, row in enumerate(original_ws_with_values.iter_rows(values_only=True)):
-            if row[2] == date_row_marker:
-                date_row_index = idx
-            if date_row_index is not None and idx == date_row_index + 1:
-                date_row_with_formula = next(original_ws_with_formula.iter_rows(min_row=idx + 1, max_row=idx + 1, values_only=False))
-                date_row_with_values = next(original_ws_with_values.iter_rows(min_row=idx + 1, max_row=idx + 1, values_only=True))
-                new_ws.append([cell_value if cell_value is not None else cell_formula.value for cell_value, cell_formula in zip(date_row_with_values, date_row_with_formula)])
-            else:
-                new_ws.append(row)
-
-        new_wb.save(self.date_preserved_file_path)
+        wb = load_workbook(self.output_path, read_only=True, data_only=True)
+        try:
+            rows = []
+            date_row_index = None
+            for idx, row in enumerate(wb[sheet_name].iter_rows(values_only=True)):
+                rows.append([self.convert_cell(value) for value in row])
+                if len(row) > 2 and row[2] == date_row_marker:
+                    date_row_index = idx
+                if date_row_index is not None and idx > self.CLASS_ROWS.stop:
+                    break
+        finally:
+            wb.close()
+
+        if date_row_index is None:
+            raise ValueError(f"'{date_row_marker}' row not found in sheet '{sheet_name}'")
+        if all(value is None for value in rows[date_row_index][3:]):
+            coach_logger.log_warning('[!] Date row has no cached values, save the workbook in Excel before importing')
+
+        # Like pd.read_excel, drop the trailing columns that are empty in every row
+        width = max((i + 1 for row in rows for i, value in enumerate(row) if value is not None), default=0)
+        rows = [row[:width] + [None] * (width - len(row)) for row in rows]
+        columns = [f'Unnamed: {i}' if value is None else value for i, value in enumerate(rows[0])]
+        self.sheet_df = pd.DataFrame(rows[1:], columns=columns)
         coach_logger.log_info(f'[+] Pre Cleaned {os.path.basename(self.output_path)}')
-        coach_logger.log_info(f'[+] Date preserved file saved to {os.path.basename(self.date_preserved_file_path)}')
 
     def load_data(self):
-        coach_logger.log_info(f'[+] Loading data from {os.path.basename(self.date_preserved_file_path)}')
-        cf_classes_df_debug = pd.read_excel(self.date_preserved_file_path, sheet_name='CF Classes')
+        if self.sheet_df is None:
+            # Fall back to a date preserved file written by an earlier run
+            coach_logger.log_info(f'[+] Loading data from {os.path.basename(self.date_preserved_file_path)}')
+            self.sheet_df = pd.read_excel(self.date_preserved_file_path, sheet_name='CF Classes')
+        cf_classes_df_debug = self.sheet_df
         date_row_index = cf_classes_df_debug[cf_classes_df_debug['Unnamed: 2'] == 'Date ->'].index[0]
         self.date_row = cf_classes_df_debug.iloc[date_row_index, 3:].dropna()
-        self.cf_classes_df_partial = cf_classes_df_debug.iloc[6:21, 2:]
+        self.cf_classes_df_partial = cf_classes_df_debug.iloc[self.CLASS_ROWS, 2:].copy()
         self.time_column = self.cf_classes_df_partial['Unnamed: 2'].dropna()
 
     
@@ -93,6 +104,13 @@ class CFClassesDataCleaner:
     def get_cf_classes_df_partial(self):
         return self.cf_classes_df_partial
     
+    @staticmethod
+    def convert_cell(value):
+        # Same as pd.read_excel, whole floats come back as ints
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        return value
+
     @staticmethod
     def format_datetime_to_mdy(datetime_objs):
         return [datetime_obj.strftime('%m/%d/%Y') for datetime_obj in datetime_objs]
@@ -100,6 +118,7 @@ class CFClassesDataCleaner:
 
 
 def main():
+    coach_logger.start()
     orginal_input_file_path = os.getenv('INPUT_FILE_PATH')
     date_preserved_file_path = os.getenv('PRESERVED_OUTPUT_FILE_PATH')
     clened_file_path = os.getenv('CLEANED_OUTPUT_FILE_PATH')
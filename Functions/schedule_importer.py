@@ -0,0 +1,207 @@
+import os
+import time
+from pymongo import InsertOne, UpdateOne, DeleteOne
+from dotenv import load_dotenv
+from logger import coach_logger
+from job_manager import job_manager
+from Functions.schedule_cleaner import CFClassesDataCleaner
+from Functions.event_creator import create_events_with_duration
+from Functions.parse_cache import parse_cache
+
+load_dotenv()
+
+DEFAULT_CHUNK_SIZE = int(os.getenv('EVENT_IMPORT_CHUNK_SIZE', 500))
+IMPORT_MODES = ('sync', 'replace')
+# Fields compared when deciding whether a stored slot needs an update
+SYNCED_FIELDS = ('end', 'title', 'pay_period', 'coach_id')
+
+
+def slot_key(event):
+    """
+    Stable key of a schedule slot. The start holds both the date and the time slot.
+    """
+    return event['start']
+
+
+def parse_schedule(input_file_path, use_cache=True):
+    """
+    Cleans the schedule workbook and builds the event dicts from it.
+
+    The cleaned frame is cached by the hash of the workbook bytes, so an
+    unchanged file skips openpyxl entirely. Returns the events and the time
+    spent in each phase (clean, build).
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    df = None
+    if use_cache:
+        cache_key = parse_cache.key_for(input_file_path)
+        df = parse_cache.load(cache_key)
+    if df is not None:
+        coach_logger.log_info(f"[+] Using cached parse of {os.path.basename(input_file_path)}")
+    else:
+        cleaner = CFClassesDataCleaner(input_file_path)
+        cleaner.preserve_dates()
+        cleaner.load_data()
+        cleaner.set_date_as_header()
+        df = cleaner.get_cf_classes_df_partial()
+        if use_cache:
+            parse_cache.store(cache_key, df)
+    timings['clean'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    events = create_events_with_duration(df)
+    timings['build'] = time.perf_counter() - start
+
+    return events, timings
+
+
+class ScheduleImporter:
+    def __init__(self, db, chunk_size=DEFAULT_CHUNK_SIZE, mode='sync'):
+        if mode not in IMPORT_MODES:
+            raise ValueError(f"Unknown import mode: {mode}")
+        self.events_collection = db.get_collection("events")
+        self.users_collection = db.get_collection("users")
+        self.chunk_size = chunk_size
+        self.mode = mode
+        self.timings = {}
+
+    async def resolve_coach_ids(self):
+        """
+        Loads every coach in a single query and returns a map of the
+        lowercased first name to the coach id.
+        """
+        coaches = await self.users_collection.find({"type": "coach"}, {"first_name": 1}).to_list(None)
+        coach_ids = {}
+        for coach in coaches:
+            first_name = coach.get("first_name")
+            if first_name:
+                # Keep the first match, the same coach find_one would have returned
+                coach_ids.setdefault(first_name.lower(), str(coach["_id"]))
+        return coach_ids
+
+    def assign_coach_ids(self, events, coach_ids):
+        """
+        Adds the coach_id to every event whose title matches a coach and
+        returns the events that can be written.
+        """
+        matched = []
+        unmatched_titles = set()
+        for event in events:
+            coach_id = coach_ids.get(str(event['title']).lower())
+            if coach_id:
+                event["coach_id"] = coach_id
+                matched.append(event)
+            else:
+                unmatched_titles.add(event['title'])
+
+        for title in sorted(unmatched_titles, key=str):
+            coach_logger.log_warning(f"[-] No coach found with first_name matching event title: {title}")
+        return matched
+
+    async def replace_events(self, events):
+        coach_logger.log_warning(f"[!] Deleting all existing events")
+        await self.events_collection.delete_many({})  # Delete all existing events
+
+        inserted_count = 0
+        for i in range(0, len(events), self.chunk_size):
+            chunk = events[i:i + self.chunk_size]
+            result = await self.events_collection.insert_many(chunk, ordered=False)
+            inserted_count += len(result.inserted_ids)
+        return {"inserted_count": inserted_count, "updated_count": 0, "deleted_count": 0, "unchanged_count": 0}
+
+    async def diff_events(self, events):
+        """
+        Compares the parsed events with the stored ones by slot key and returns
+        the write operations needed to bring the collection in line with the sheet.
+        """
+        new_events = {}
+        for event in events:
+            new_events.setdefault(slot_key(event), event)
+
+        projection = {field: 1 for field in ('start',) + SYNCED_FIELDS}
+        stored_events = await self.events_collection.find({}, projection).to_list(None)
+
+        operations = []
+        unchanged_count = 0
+        for stored in stored_events:
+            event = new_events.pop(slot_key(stored), None)
+            if event is None:
+                # Slot no longer in the sheet, or a duplicate of a slot already matched
+                operations.append(DeleteOne({"_id": stored["_id"]}))
+                continue
+
+            event["_id"] = stored["_id"]
+            changes = {field: event.get(field) for field in SYNCED_FIELDS if stored.get(field) != event.get(field)}
+            if changes:
+                operations.append(UpdateOne({"_id": stored["_id"]}, {"$set": changes}))
+            else:
+                unchanged_count += 1
+
+        operations.extend(InsertOne(event) for event in new_events.values())
+        return operations, unchanged_count
+
+    async def sync_events(self, events):
+        operations, unchanged_count = await self.diff_events(events)
+        counts = {"inserted_count": 0, "updated_count": 0, "deleted_count": 0, "unchanged_count": unchanged_count}
+        if operations:
+            result = await self.events_collection.bulk_write(operations, ordered=False)
+            counts.update(
+                inserted_count=result.inserted_count,
+                updated_count=result.modified_count,
+                deleted_count=result.deleted_count,
+            )
+        coach_logger.log_info(
+            f"[+] Synced events: {counts['inserted_count']} inserted, {counts['updated_count']} updated, "
+            f"{counts['deleted_count']} deleted, {unchanged_count} unchanged"
+        )
+        return counts
+
+    async def write_events(self, events):
+        if self.mode == 'replace':
+            counts = await self.replace_events(events)
+        else:
+            counts = await self.sync_events(events)
+
+        # Convert ObjectId to str for JSON serialization
+        for event in events:
+            if "_id" in event:
+                event["_id"] = str(event["_id"])
+        return counts
+
+    async def run(self, events, timings=None, job=None):
+        """
+        Resolves the coaches for the parsed events and writes them in batches.
+        When a job is given its phase and progress are updated as the import runs.
+        """
+        self.timings = dict(timings or {})
+
+        if job:
+            job.set_phase("resolve", 0.7)
+        start = time.perf_counter()
+        coach_ids = await self.resolve_coach_ids()
+        matched_events = self.assign_coach_ids(events, coach_ids)
+        self.timings['resolve'] = time.perf_counter() - start
+
+        if job:
+            job.set_phase("write", 0.8)
+        start = time.perf_counter()
+        counts = await self.write_events(matched_events)
+        self.timings['write'] = time.perf_counter() - start
+
+        for phase, seconds in self.timings.items():
+            coach_logger.log_info(f"[+] Import phase '{phase}' took {seconds:.3f}s")
+        coach_logger.log_info(f"[+] Inserted {counts['inserted_count']} events into the database")
+        return {**counts, "mode": self.mode, "events": events, "timings": self.timings}
+
+
+async def run_import_job(job, db, input_file_path, chunk_size=DEFAULT_CHUNK_SIZE, mode='sync'):
+    """
+    Background import: the workbook is parsed in the job process pool and the
+    results are written from the event loop.
+    """
+    job.set_phase("parse", 0.1)
+    events, timings = await job_manager.run_in_process(parse_schedule, input_file_path)
+    importer = ScheduleImporter(db, chunk_size=chunk_size, mode=mode)
+    return await importer.run(events, timings, job=job)
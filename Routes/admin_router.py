@@ -6,6 +6,8 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pymongo import ReturnDocument
 from db import get_database
 from logger import coach_logger
+from metrics import TimedRoute, registry
+from fastapi.responses import PlainTextResponse
 from datetime import timedelta, datetime
 from dotenv import load_dotenv
 from jose import JWTError, jwt
@@ -21,7 +23,7 @@ from starlette.status import WS_1008_POLICY_VIOLATION
 # from Functions.Slack.slack_functions import update_slack
 load_dotenv()
 
-admin_router = APIRouter()
+admin_router = APIRouter(route_class=TimedRoute)
 
 
 async def update_weekly_materials(db, pdf_link: str, video_links: Dict[str, str], current_week_number: int):
@@ -111,6 +113,12 @@ async def get_users(db=Depends(get_database), admin: Admin = Depends(admin_depen
 
 
 
+@admin_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics(admin: Admin = Depends(admin_dependency)):
+    # Prometheus text exposition format
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 @admin_router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket, db=Depends(get_database)):
     await websocket.accept()
@@ -1,10 +1,15 @@
 from fastapi import Depends, HTTPException, status, Query, APIRouter, Body, Response, Request, File, UploadFile
 from models import User, Admin, Token, TokenData, Coach, Event, CoachHours, CoachDetail, CoachPublic, EventPublic, CoachHoursPublic, CreateUserData, TokenPublic, UpdateUserData
-from auth import authenticate_user, verify_password, create_tokens, get_current_user, get_user, get_password_hash, admin_dependency
+from auth import authenticate_user, verify_password, create_tokens, get_current_user, get_user, get_user_by_id, get_password_hash, admin_dependency
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pymongo import ReturnDocument
 from db import get_database
 from logger import coach_logger
+from metrics import TimedRoute
+from user_cache import user_cache
+from api_key_store import api_key_store
+from password_service import password_service
+from token_store import token_store
 from datetime import timedelta, datetime
 from dotenv import load_dotenv
 from jose import JWTError, jwt
@@ -15,7 +20,7 @@ import secrets
 
 load_dotenv()
 
-auth_router = APIRouter()
+auth_router = APIRouter(route_class=TimedRoute)
 
 @auth_router.post("/signup", response_model=TokenPublic)
 async def create_coach(response: Response, create_user_data: CreateUserData, db = Depends(get_database)):
@@ -33,7 +38,7 @@ async def create_coach(response: Response, create_user_data: CreateUserData, db
         coach_logger.log_error("[-] Password cannot be empty")
         raise HTTPException(status_code=400, detail="Password cannot be empty")
     # Hash the password
-    hashed_password = get_password_hash(create_user_data.password)
+    hashed_password = await password_service.hash(create_user_data.password)
 
     new_coach = {
         "email": create_user_data.email,
@@ -55,7 +60,7 @@ async def create_coach(response: Response, create_user_data: CreateUserData, db
     tokens = await create_tokens(db, data=token_data)  # Make sure create_tokens is an async function
     
     # Save the refresh token in the database
-    coach_logger.log_info(f"[+] Setting refresh token as HttpOnly cookie: {tokens['refresh_token']}")
+    coach_logger.log_info("[+] Setting refresh token as HttpOnly cookie")
     # response.set_cookie(
     #     key="refresh_token", 
     #     value=tokens["refresh_token"], 
@@ -91,7 +96,7 @@ async def get_token(response: Response, form_data: OAuth2PasswordRequestForm = D
         coach_logger.log_error("[-] Could not create tokens")
         raise HTTPException(status_code=500, detail="Could not create tokens")
     
-    coach_logger.log_info(f"[+] Setting refresh token as HttpOnly cookie: {tokens['refresh_token']}")
+    coach_logger.log_info("[+] Setting refresh token as HttpOnly cookie")
     # response.set_cookie(
     #     path="/",
     #     samesite="None",
@@ -129,10 +134,18 @@ async def logout(request: Request, response: Response, db = Depends(get_database
         coach_logger.log_error("[-] Refresh token not found")
         raise HTTPException(status_code=401, detail="Refresh token not found")
 
-    # Delete the refresh token from the database
-    coach_logger.log_warning(f"[!] Deleting refresh token: {refresh_token}")
-    result = await db.tokens.delete_one({"refresh_token": refresh_token})
-    if result.deleted_count == 0:
+    # Delete the refresh token's session from the database, expired tokens still sign out
+    try:
+        payload = jwt.decode(refresh_token, os.getenv("REFRESH_TOKEN_SECRET"), algorithms=["HS256"], options={"verify_exp": False})
+    except JWTError:
+        payload = {}
+    jti = payload.get("jti")
+    coach_logger.log_warning(f"[!] Deleting refresh token: {jti or 'legacy'}")
+    if jti:
+        deleted = await token_store.revoke(db, jti)
+    else:
+        deleted = await token_store.revoke_legacy(db, refresh_token) is not None
+    if not deleted:
         coach_logger.log_warning("[!] Refresh token not found in database")
         # raise HTTPException(status_code=401, detail="Refresh token not found in database")
 
@@ -158,26 +171,29 @@ async def refresh_tokens(request: Request, response: Response, db = Depends(get_
         coach_logger.log_error("[-] Invalid refresh token")
         raise HTTPException(status_code=401, detail="Invalid refresh token")
     
-    # Verify the token exists in the database
-    stored_token = await db.tokens.find_one({"refresh_token": refresh_token})
-    if not stored_token:
-        coach_logger.log_error("[-] Refresh token not found in database")
-        raise HTTPException(status_code=401, detail="Invalid Refresh Token")
-
-    # Delete the old refresh token from the database
-    coach_logger.log_warning(f"[!] Deleting old refresh token: {refresh_token}")
-    await db.tokens.delete_one({"refresh_token": refresh_token})
-
-    # Generate new access and refresh tokens
     user_id = payload.get("user_id")
     email = payload.get("email")
     token_data = {"email": email, "user_id": user_id}
-    new_tokens = await create_tokens(db, data=token_data)
 
-    # Get the user form db from the user_id
-    user = await get_user(db, email)
+    jti = payload.get("jti")
+    if jti:
+        # Rotates the session in one round trip, fails if the token was already used
+        new_tokens = await create_tokens(db, data=token_data, rotate_jti=jti, family=payload.get("fid"))
+    elif await token_store.revoke_legacy(db, refresh_token):
+        # Token issued before tokens carried a jti, start a new session for it
+        new_tokens = await create_tokens(db, data=token_data)
+    else:
+        new_tokens = {}
+    if not new_tokens:
+        coach_logger.log_error("[-] Refresh token not found in database")
+        raise HTTPException(status_code=401, detail="Invalid Refresh Token")
+
+    user = await get_user_by_id(db, user_id)
+    if user is None:
+        coach_logger.log_error("[-] Refresh token user not found")
+        raise HTTPException(status_code=401, detail="Invalid Refresh Token")
     # Set the new refresh token as HttpOnly cookie
-    coach_logger.log_info(f"[+] Setting new refresh token as HttpOnly cookie: {new_tokens['refresh_token']}")
+    coach_logger.log_info("[+] Setting new refresh token as HttpOnly cookie")
     # response.set_cookie(
     #     key="refresh_token", 
     #     value=new_tokens["refresh_token"], 
@@ -215,6 +231,7 @@ async def upload_image(file: UploadFile = File(...), db=Depends(get_database), c
         {"email": current_user.email},
         {"$set": {"image_url": image_url}}
     )
+    user_cache.invalidate(current_user.id)
     
     # Check if the update was successful
     if result.modified_count == 1:
@@ -245,6 +262,7 @@ async def update_user_details(update_data: UpdateUserData, db=Depends(get_databa
         {"$set": update_dict},
         return_document=ReturnDocument.AFTER
     )
+    user_cache.invalidate(current_user.id)
     
     if result:
         return {
@@ -287,6 +305,7 @@ async def generate_and_store_api_key(admin: Admin = Depends(admin_dependency), d
 
     # Save the new API key and the creation date and time in the database
     await db.api_keys.insert_one({"api_key": new_api_key, "created_at": created_at})
+    api_key_store.add(new_api_key)
 
     # Return the new API key (You might want to send this in a more secure way than just returning it)
     return {"api_key": new_api_key}
@@ -1,16 +1,18 @@
 # comments_router.py
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from typing import List, Union
+from typing import List, Union, Optional
 from db import get_database
 from models import CommentCreate, CommentInDB, Comment, Coach
 from datetime import datetime, timedelta
 from auth import get_current_user
+from metrics import TimedRoute
 from bson import ObjectId
 import os
 import pytz
+import base64
 
-comments_router = APIRouter()
+comments_router = APIRouter(route_class=TimedRoute)
 
 
 @comments_router.post("/comments", response_model=Comment)
@@ -34,12 +36,29 @@ async def create_comment(comment: CommentCreate, db=Depends(get_database), curre
     # return CommentInDB(**{**new_comment, "_id": str(new_comment["_id"])})
     return CommentInDB(**new_comment)
 
+def encode_comment_cursor(comment):
+    raw = f"{comment['date'].isoformat()}|{comment['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_comment_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        date_str, comment_id = raw.split("|")
+        return datetime.fromisoformat(date_str), ObjectId(comment_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 # @comments_router.get("/comments", response_model=List[Union[Comment, dict]])
 @comments_router.get("/comments")
-async def read_comments(date: datetime = Query(None, alias="date"), db=Depends(get_database), current_user: Coach = Depends(get_current_user),):
+async def read_comments(response: Response, date: datetime = Query(None, alias="date"), after: Optional[str] = Query(None), limit: int = Query(100, ge=1, le=500), db=Depends(get_database), current_user: Coach = Depends(get_current_user),):
+    """
+    Returns comments ordered by (date, _id). When a full page is returned the
+    X-Next-Cursor header holds the value to pass as `after` for the next page.
+    """
     comments_collection = db.get_collection("comments")
     users_collection = db.get_collection("users")
     
+    conditions = []
     if date:
         # Assume 'date' is in local time and convert to UTC
         # If 'date' is already in UTC, remove the conversion
@@ -49,24 +68,29 @@ async def read_comments(date: datetime = Query(None, alias="date"), db=Depends(g
         end_of_day_utc = start_of_day_utc + timedelta(days=1)
         
         # Filter comments by the date
-        comments = await comments_collection.find({
-            "date": {
-                "$gte": start_of_day_utc,
-                "$lt": end_of_day_utc
-            }
-        }).to_list(100)
-    else:
-        comments = await comments_collection.find({}).to_list(100)
-    
+        conditions.append({"date": {"$gte": start_of_day_utc, "$lt": end_of_day_utc}})
+    if after:
+        after_date, after_id = decode_comment_cursor(after)
+        conditions.append({"$or": [{"date": {"$gt": after_date}}, {"date": after_date, "_id": {"$gt": after_id}}]})
+
+    query = {"$and": conditions} if conditions else {}
+    comments = await comments_collection.find(query).sort([("date", 1), ("_id", 1)]).limit(limit).to_list(limit)
+
+    if len(comments) == limit:
+        response.headers["X-Next-Cursor"] = encode_comment_cursor(comments[-1])
+
+    # Fetch every coach on the page in one query
+    coach_ids = {ObjectId(comment["coach_id"]) for comment in comments if ObjectId.is_valid(comment.get("coach_id"))}
+    coaches = await users_collection.find(
+        {"_id": {"$in": list(coach_ids)}},
+        {"first_name": 1, "last_name": 1, "email": 1, "image_url": 1}
+    ).to_list(None) if coach_ids else []
+    coaches_by_id = {str(coach["_id"]): coach for coach in coaches}
+
      # Prepare the output list
     enriched_comments = []
     for comment in comments:
-        # comment_dict = CommentInDB(**{**comment, "id": str(comment["_id"])})
-        # comment_dict = comment_dict.model_dump()  # Convert CommentInDB object to dictionary
-        
-        # Fetch the user who matches with coach_id
-        coach_info = await users_collection.find_one({"_id": ObjectId(comment.get("coach_id", None))})
-        # print(coach_info)
+        coach_info = coaches_by_id.get(comment.get("coach_id"))
         if coach_info:
             # You can choose which user fields you want to include
             comment["coach_info"] = {
@@ -78,7 +102,6 @@ async def read_comments(date: datetime = Query(None, alias="date"), db=Depends(g
 
         # Convert ObjectId to str for JSON serialization
         comment["_id"] = str(comment["_id"])
-        # print(comment)
         enriched_comments.append(comment)
     
     return enriched_comments
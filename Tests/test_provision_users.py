@@ -0,0 +1,22 @@
+from Functions.provision_users import build_user_update, load_users
+
+
+def test_build_user_update_drops_unknown_fields():
+    user = {"email": "coach@example.com", "password": "secret", "first_name": "Ann", "last_name": "Lee",
+            "type": "coach", "is_admin": "True", "disabled": "False", "_id": "abc", "hashed_password": "x"}
+
+    update = build_user_update(user, "hashed", reset_password=True)
+
+    assert update["$set"] == {"first_name": "Ann", "last_name": "Lee", "type": "coach", "hashed_password": "hashed"}
+    assert update["$setOnInsert"] == {"disabled": False, "isActive": False, "welcomed": False}
+
+
+def test_load_users_ignores_is_admin_column(tmp_path):
+    roster = tmp_path / "roster.csv"
+    roster.write_text("email,first_name,last_name,password,is_admin\ncoach@example.com,Ann,Lee,secret,True\n")
+
+    users = load_users(str(roster))
+
+    update = build_user_update(users[0], "hashed")
+    assert "is_admin" not in update["$set"]
+    assert "is_admin" not in update["$setOnInsert"]
@@ -0,0 +1,83 @@
+import asyncio
+import os
+from datetime import datetime
+from typing import Dict, Set
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+from logger import coach_logger
+from presence_engine import presence_engine
+from user_cache import user_cache
+from websocket_manager import manager
+
+load_dotenv()
+
+
+class ActivityTracker:
+    """
+    Write-behind tracker of user activity.
+
+    Requests only record the user's latest request time in memory. A background
+    task flushes the coalesced last_request_at/isActive updates with one
+    bulk_write every flush_interval seconds, and broadcasts a
+    user_status_update only when a user goes from inactive to active.
+    Every record also pushes back the user's presence deadline.
+    """
+    def __init__(self, flush_interval: float = 5.0):
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, datetime] = {}
+        self._activated: Set[str] = set()  # Inactive -> active transitions not broadcast yet
+        self._task = None
+
+    def record(self, user, when: datetime = None):
+        when = when or datetime.utcnow()
+        self._pending[user.id] = when
+        if not presence_engine.is_active(user.id):
+            # Expired or never seen by this process, even if the stored isActive is stale
+            self._activated.add(user.id)
+        presence_engine.touch(user.id)
+        user_cache.update(user.id, last_request_at=when, isActive=True)
+
+    async def flush(self, db):
+        pending, self._pending = self._pending, {}
+        activated, self._activated = self._activated, set()
+        if pending:
+            operations = [
+                UpdateOne({"_id": ObjectId(user_id)}, {"$set": {"last_request_at": when, "isActive": True}})
+                for user_id, when in pending.items()
+            ]
+            try:
+                await db.users.bulk_write(operations, ordered=False)
+            except Exception as e:
+                coach_logger.log_error(f"[-] Failed to flush user activity, retrying next tick: {e}")
+                # Keep the newest time per user, requests may have come in during the write
+                for user_id, when in pending.items():
+                    if user_id not in self._pending or self._pending[user_id] < when:
+                        self._pending[user_id] = when
+                self._activated |= activated
+                return
+
+        for user_id in activated:
+            await manager.broadcast({"message": "user_status_update", "user_id": user_id, "isActive": True})
+
+    async def _run(self, db):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush(db)
+
+    def start(self, db):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(db))
+
+    async def stop(self, db):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush(db)
+
+
+activity_tracker = ActivityTracker(flush_interval=float(os.getenv('ACTIVITY_FLUSH_SECONDS', 5)))
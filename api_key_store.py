@@ -0,0 +1,78 @@
+import asyncio
+import hashlib
+import os
+import time
+from dotenv import load_dotenv
+from logger import coach_logger
+
+load_dotenv()
+
+
+def hash_api_key(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+class ApiKeyStore:
+    """
+    In-memory set of valid API keys, stored as sha256 hashes.
+
+    Keys are hashed before the lookup, so the time a set lookup takes depends
+    on the digest, not on how much of a stored key the caller guessed.
+
+    The set is reloaded from the api_keys collection every refresh_seconds, and
+    right away when a change stream reports a change (if the deployment supports
+    change streams). Keys generated by this process are added directly.
+    """
+    def __init__(self, refresh_seconds: float = 60):
+        self.refresh_seconds = refresh_seconds
+        self._hashes = set()
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+        self._watch_task = None
+
+    async def refresh(self, db):
+        hashes = set()
+        async for key in db.api_keys.find({}, {"api_key": 1}):
+            if key.get("api_key"):
+                hashes.add(hash_api_key(key["api_key"]))
+        self._hashes = hashes
+        self._expires_at = time.monotonic() + self.refresh_seconds
+
+    async def is_valid(self, db, api_key: str) -> bool:
+        if time.monotonic() >= self._expires_at:
+            async with self._lock:
+                # Another request may have refreshed while we waited
+                if time.monotonic() >= self._expires_at:
+                    await self.refresh(db)
+
+        return hash_api_key(api_key) in self._hashes
+
+    def add(self, api_key: str):
+        self._hashes.add(hash_api_key(api_key))
+
+    async def _watch(self, db):
+        try:
+            async with db.api_keys.watch() as stream:
+                coach_logger.log_info("[+] Watching api_keys for changes")
+                async for _ in stream:
+                    await self.refresh(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            coach_logger.log_warning(f"[!] api_keys change stream unavailable, refreshing every {self.refresh_seconds}s instead: {e}")
+
+    def start(self, db):
+        if self._watch_task is None:
+            self._watch_task = asyncio.create_task(self._watch(db))
+
+    async def stop(self):
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+
+
+api_key_store = ApiKeyStore(refresh_seconds=float(os.getenv('API_KEY_REFRESH_SECONDS', 60)))
@@ -18,6 +18,9 @@ from auth import authenticate_user, verify_password, create_tokens, get_current_
 from models import User, Token, TokenData, Coach, Event, CoachHours, CoachDetail, CoachPublic, EventPublic, CoachHoursPublic, CreateUserData, FeatureRequestCreate, FeatureRequestModel, FeatureRequestInDB
 from fastapi.responses import FileResponse
 from logger import coach_logger
+from activity_tracker import activity_tracker
+from metrics import MetricsMiddleware, TimedRoute, record_phase, SERVER_TIMING_ENABLED
+import time
 import pytz
 import pandas as pd
 from jose import ExpiredSignatureError, JWTError, jwt
@@ -44,6 +47,7 @@ CLEANED_OUTPUT_FILE_PATH = r'C:/Users/carte/OneDrive/Documents/Code/Coach Box/ba
 load_dotenv()
 
 app = FastAPI(lifespan=lifespan)
+app.router.route_class = TimedRoute
 
 # app.add_middleware(
 #     CORSMiddleware,
@@ -68,31 +72,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["x-expired"]  # Add your custom headers here
+    expose_headers=["x-expired", "x-next-cursor", *(["server-timing"] if SERVER_TIMING_ENABLED else [])]  # Add your custom headers here
 )
 
 @app.middleware("http")
 async def update_last_request_data(request: Request, call_next):
-    response = await call_next(request)
     # Skip middleware logic for refresh endpoint
     if request.url.path == "/refresh":
-        return response
+        return await call_next(request)
     if "Authorization" not in request.headers:
         # This is a non authenticated request
         # Not able to track user activity
-        # coach_logger.log_info("[+] No Authorization header found")
-        return response
-    # coach_logger.log_info("[+] Authorization header found")
-    token = request.headers.get("Authorization").split(" ")[1]
+        return await call_next(request)
+    token = request.headers.get("Authorization").partition(" ")[2]
     if token == "Og==":
         # This is a non authenticated request
         # Not able to track user activity
         # This is a login request
-        # coach_logger.log_info("[+] Token is 'Basic Og=='. Skipping...")
-        return response
+        return await call_next(request)
     try:
+        # Decode and resolve the token once, the auth dependencies read the result from request.state
         db = await get_database()
-        user = await get_current_user_manual(token=token, db=db)
+        auth_start = time.perf_counter()
+        user = await get_current_user_manual(token=token, db=db, request=request)
+        record_phase("auth", time.perf_counter() - auth_start)
         if user == "TokenExpired":
             return JSONResponse(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -110,18 +113,22 @@ async def update_last_request_data(request: Request, call_next):
                 status_code=401,
                 content={"detail": "Invalid token."},
             )
-        if user:
-            await db.users.update_one(
-                {"_id": ObjectId(user.id)},
-                {"$set": {"last_request_at": datetime.utcnow(), "isActive": True}}
-            )
-
-        return response
     except Exception as e:
         # Log and handle any other exceptions
         print('500 error')
         return Response("An error occurred", status_code=500)
 
+    response = await call_next(request)
+
+    if user:
+        # Written to the database in batches by the activity tracker
+        activity_tracker.record(user)
+
+    return response
+
+# Added last so it is the outermost middleware and the latency histograms include the others
+app.add_middleware(MetricsMiddleware)
+
 
 app.include_router(auth_router, prefix="/api/auth", tags=["auth"])
 app.include_router(events_router, prefix="/api/events", tags=["events"])
@@ -1,6 +1,5 @@
-from fastapi import Depends, HTTPException, status, Header
+from fastapi import Depends, HTTPException, status, Header, Request
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from passlib.context import CryptContext
 from models import User, Token, TokenData, Coach, Admin, Event, CoachHours, CoachDetail, CoachPublic, EventPublic, CoachHoursPublic, CreateUserData
 from datetime import timedelta, datetime
 from jose import jwt, JWTError
@@ -13,6 +12,11 @@ from bson import ObjectId
 # from Routes.admin_router import manager
 
 from websocket_manager import manager
+from user_cache import user_cache
+from presence_engine import presence_engine
+from api_key_store import api_key_store
+from password_service import password_service, pwd_context
+from token_store import token_store, new_jti
 
 load_dotenv()
 
@@ -20,10 +24,10 @@ SECRET_KEY = "diddydoggy"
 ALGS = ["HS256"]
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth_2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/signin")
 
 
+# Blocking, request handlers use password_service instead
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -37,23 +41,43 @@ async def verify_admin(db, user_id: str):
     admin = await db.users.find_one({"user_id": ObjectId(user_id), "is_admin": True})
     return admin is not None
 
+def build_user(user):
+    user['id'] = str(user.pop('_id'))  # Rename '_id' to 'id' and convert ObjectId to str
+
+    if user.get('type').lower() == 'coach':
+        return Coach(**user)
+    if user.get('type').lower() == 'admin':
+        return User(**user)
+
 async def get_user(db, email: str):
     user = await db.users.find_one({"email": email})
     if user:
-        user['id'] = str(user.pop('_id'))  # Rename '_id' to 'id' and convert ObjectId to str
+        return build_user(user)
 
-        if user.get('type').lower() == 'coach':
-            return Coach(**user)
-        if user.get('type').lower() == 'admin':
-            return User(**user)
+async def get_user_by_id(db, user_id: str):
+    """
+    Resolves a user by id through the in-process user cache.
+    """
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+    if not ObjectId.is_valid(user_id):
+        return None
+    user_doc = await db.users.find_one({"_id": ObjectId(user_id)})
+    if user_doc:
+        user = build_user(user_doc)
+        if user is not None:
+            user_cache.set(user_id, user)
+        return user
     
 async def authenticate_user(db, email: str, password: str):
     user = await get_user(db, email)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    if not await password_service.verify(password, user.hashed_password):
         return False
-    
+    presence_engine.touch(user.id)
+
         # Check if the user has been welcomed or if the status is 'inactive'
     if not user.welcomed or not user.isActive:
         # Update the user document in the database
@@ -67,6 +91,7 @@ async def authenticate_user(db, email: str, password: str):
             {"_id": ObjectId(user.id)},
             {"$set": update_values}
         )
+        user_cache.invalidate(user.id)
 
         # Update the user object
         user.welcomed = True
@@ -75,7 +100,13 @@ async def authenticate_user(db, email: str, password: str):
         await manager.broadcast({"message": "user_status_update", "user_id": user.id, "welcomed": True, "isActive": True})
     return user
 
-async def create_tokens(db, data: dict, access_expires_delta: Optional[timedelta] = None, refresh_expires_delta: Optional[timedelta] = None):
+async def create_tokens(db, data: dict, access_expires_delta: Optional[timedelta] = None, refresh_expires_delta: Optional[timedelta] = None, rotate_jti: Optional[str] = None, family: Optional[str] = None):
+    """
+    Creates an access and refresh token pair. The refresh token carries a jti and
+    its session family. With rotate_jti the session of that refresh token is
+    rotated in place instead of starting a new one, and {} is returned if it is
+    no longer valid.
+    """
     coach_logger.log_info(f"[+] Creating tokens for user: {data.get('email')}")
     if access_expires_delta:
         access_expire = datetime.utcnow() + access_expires_delta
@@ -93,8 +124,10 @@ async def create_tokens(db, data: dict, access_expires_delta: Optional[timedelta
     refresh_data = data.copy()
 
 
+    jti = new_jti()
+    family = family or new_jti()
     access_data.update({"exp": access_expire})
-    refresh_data.update({"exp": refresh_expire})
+    refresh_data.update({"exp": refresh_expire, "jti": jti, "fid": family})
 
     try:
         access_token = jwt.encode(access_data, os.getenv('ACCESS_TOKEN_SECRET'), algorithm=ALGS[0])
@@ -105,15 +138,16 @@ async def create_tokens(db, data: dict, access_expires_delta: Optional[timedelta
         print(f"An error occurred while encoding the token: {e}")
         return {}
     
-    # Save the refresh token in the MongoDB database
+    # Save or rotate the refresh token's session in the MongoDB database
     try:
-        coach_logger.log_info(f"[+] Saving new refresh token: {refresh_token}")
-        await db.tokens.insert_one({
-            "user_id": data.get("user_id"),  # The user's email
-            "refresh_token": refresh_token,
-            "user_email": data.get("email"),
-            "expires_at": refresh_expire
-        })
+        if rotate_jti:
+            session = await token_store.rotate(db, rotate_jti, jti, refresh_expire)
+            if session is None:
+                coach_logger.log_error(f"[-] Refresh token {rotate_jti} is no longer valid")
+                return {}
+        else:
+            coach_logger.log_info(f"[+] Saving new refresh token: {jti}")
+            await token_store.issue(db, jti, family, data.get("user_id"), data.get("email"), refresh_expire)
     except Exception as e:
         # Handle the exception (you can raise a custom exception or log the error)
         coach_logger.log_error(f"[-] An error occurred while saving the refresh token: {e}")
@@ -121,7 +155,20 @@ async def create_tokens(db, data: dict, access_expires_delta: Optional[timedelta
     
     return {"access_token": access_token, "refresh_token": refresh_token}
 
-async def get_current_user(token: str = Depends(oauth_2_scheme), db = Depends(get_database)):
+def get_request_user(request: Request, token: str):
+    """
+    Returns the user the auth middleware already resolved for this token, if any.
+    """
+    if getattr(request.state, "auth_token", None) == token:
+        return getattr(request.state, "user", None)
+    return None
+
+async def get_current_user(request: Request, token: str = Depends(oauth_2_scheme), db = Depends(get_database)):
+    # The middleware decodes and resolves the token once per request
+    user = get_request_user(request, token)
+    if user is not None:
+        return user
+
     cred_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials", headers={"WWW-Authenticate": "Bearer"})
 
     try:
@@ -142,7 +189,7 @@ async def get_current_user(token: str = Depends(oauth_2_scheme), db = Depends(ge
         raise cred_exception
                                        
 
-    user = await get_user(db, token_data.email)
+    user = await get_user_by_id(db, token_data.user_id)
     if user is None:
         coach_logger.log_error(f"[-] Could not validate credentials, user not found: {cred_exception}")
         raise cred_exception
@@ -150,7 +197,12 @@ async def get_current_user(token: str = Depends(oauth_2_scheme), db = Depends(ge
     return user
     ...
 
-async def get_current_user_manual(token: str, db):
+async def get_current_user_manual(token: str, db, request: Optional[Request] = None):
+    """
+    Decodes the token and resolves its user, returning "TokenExpired" or "InvalidToken"
+    instead of raising. When a request is given the claims and user are stored on
+    request.state for get_current_user and the other auth dependencies.
+    """
     cred_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials", headers={"WWW-Authenticate": "Bearer"})
 
     try:
@@ -172,10 +224,15 @@ async def get_current_user_manual(token: str, db):
         raise cred_exception
                                        
 
-    user = await get_user(db, token_data.email)
+    user = await get_user_by_id(db, token_data.user_id)
     if user is None:
         coach_logger.log_error(f"[-] Could not validate credentials, user not found: {cred_exception}")
         raise cred_exception
+
+    if request is not None:
+        request.state.auth_token = token
+        request.state.token_data = token_data
+        request.state.user = user
     
     return user
     ...
@@ -188,13 +245,11 @@ async def get_current_active_user(current_user: Union[User, Coach] = Depends(get
     
 async def get_user_as_admin(db, user_id: str):
     """
-    Retrieves the user document and checks if the user is marked as an admin.
+    Retrieves the user (through the user cache) and checks if the user is marked as an admin.
     """
-    admin_user = await db.users.find_one({"_id": ObjectId(user_id), "is_admin": True})
-    if admin_user:
-        # Turn _id to id and convert ObjectId to str
-        admin_user['id'] = str(admin_user.pop('_id'))
-        return Admin(**admin_user)  # Assuming that the Admin model is defined and it can take a MongoDB document as input
+    user = await get_user_by_id(db, user_id)
+    if user and user.is_admin:
+        return Admin(**user.model_dump())
     return None
 
 async def admin_dependency(user: User = Depends(get_current_user), db = Depends(get_database)):
@@ -202,7 +257,7 @@ async def admin_dependency(user: User = Depends(get_current_user), db = Depends(
     Dependency function to be used in routes that require admin access.
     It verifies if the current user is an admin.
     """
-    admin_user = await get_user_as_admin(db, user.id)
+    admin_user = Admin(**user.model_dump()) if user.is_admin else None
     if not admin_user:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -235,18 +290,10 @@ async def validate_admin_token(token: str, db) -> User:
         print(e)
         return None
 
-async def get_api_keys(db):
-    # For example, fetching from the database:
-    api_keys = await db.api_keys.find({}).to_list(length=100)
-    return [key["api_key"] for key in api_keys]
-
 # Dependency function to verify the API key
 async def api_key_validator(api_key: str = Header(...), db = Depends(get_database)):
-    # Fetch the valid API keys
-    valid_api_keys = await get_api_keys(db)
-    
-    # Check if the provided API key is in the list of valid keys
-    if api_key not in valid_api_keys:
+    # Keys are checked against the in-memory hashed key set
+    if not await api_key_store.is_valid(db, api_key):
         coach_logger.log_error("[-] Invalid API key provided")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -0,0 +1,133 @@
+import time
+from datetime import datetime
+from bson import ObjectId
+from pymongo import ASCENDING, UpdateOne
+from logger import coach_logger
+
+# Event start/end are stored as BSON datetimes holding the gym's wall clock time (no timezone)
+EVENT_DATE_FIELDS = ("start", "end")
+
+TIME_SLOTS_TEMPLATE_ID = ObjectId("6565e8281698673a91df0941")
+TIME_SLOTS_CACHE_SECONDS = 300
+_time_slots_cache = {"expires_at": 0.0, "time_slots": None}
+
+
+def to_event_datetime(value):
+    """
+    Normalizes a datetime or ISO string to the naive wall clock datetime stored on events.
+    """
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.removesuffix("Z"))
+    if value.tzinfo is not None:
+        value = value.replace(tzinfo=None)
+    return value
+
+
+def serialize_event(event):
+    if "_id" in event:
+        event["_id"] = str(event["_id"])
+    return event
+
+
+async def ensure_event_indexes(db):
+    coach_logger.log_info("[+] Ensuring events indexes...")
+    events_collection = db.get_collection("events")
+    await events_collection.create_index([("coach_id", ASCENDING), ("start", ASCENDING)], name="coach_id_start")
+    await events_collection.create_index([("start", ASCENDING)], name="start")
+
+
+async def migrate_event_dates(db, batch_size=1000):
+    """
+    Converts events still storing start/end as ISO strings to BSON datetimes.
+    Safe to run repeatedly, only string dates are touched.
+    """
+    events_collection = db.get_collection("events")
+    query = {"$or": [{field: {"$type": "string"}} for field in EVENT_DATE_FIELDS]}
+    cursor = events_collection.find(query, {field: 1 for field in EVENT_DATE_FIELDS})
+
+    migrated_count = 0
+    operations = []
+    async for event in cursor:
+        changes = {field: to_event_datetime(event[field]) for field in EVENT_DATE_FIELDS if isinstance(event.get(field), str)}
+        operations.append(UpdateOne({"_id": event["_id"]}, {"$set": changes}))
+        if len(operations) >= batch_size:
+            result = await events_collection.bulk_write(operations, ordered=False)
+            migrated_count += result.modified_count
+            operations = []
+    if operations:
+        result = await events_collection.bulk_write(operations, ordered=False)
+        migrated_count += result.modified_count
+
+    if migrated_count:
+        coach_logger.log_info(f"[+] Migrated {migrated_count} events to datetime start/end")
+    return migrated_count
+
+
+async def find_events_in_range(db, start, end, coach_id=None, inclusive_end=False):
+    """
+    Returns the events starting in [start, end), or [start, end] with inclusive_end,
+    optionally for a single coach, ordered by start.
+    """
+    query = {"start": {"$gte": to_event_datetime(start), "$lte" if inclusive_end else "$lt": to_event_datetime(end)}}
+    if coach_id is not None:
+        query["coach_id"] = coach_id
+    return await db.get_collection("events").find(query).sort("start", ASCENDING).to_list(length=None)
+
+
+async def find_coach_events(db, coach_id, limit=10000):
+    return await db.get_collection("events").find({"coach_id": coach_id}).sort("start", ASCENDING).to_list(length=limit)
+
+
+async def find_upcoming_events(db, coach_id, after, limit=3):
+    cursor = db.get_collection("events").find(
+        {"coach_id": coach_id, "start": {"$gte": to_event_datetime(after)}},
+        sort=[("start", ASCENDING)]
+    ).limit(limit)
+    return await cursor.to_list(length=limit)
+
+
+async def find_event_by_start(db, start):
+    return await db.get_collection("events").find_one({"start": to_event_datetime(start)})
+
+
+async def aggregate_coach_hours(db, coach_id, start, end):
+    """
+    Sums the real (end - start) hours of a coach's events starting in [start, end],
+    grouped by pay period. Returns the total and the per pay period breakdown.
+    """
+    pipeline = [
+        {"$match": {"coach_id": coach_id, "start": {"$gte": to_event_datetime(start), "$lte": to_event_datetime(end)}}},
+        {"$group": {
+            "_id": "$pay_period",
+            # Date subtraction gives milliseconds
+            "hours": {"$sum": {"$divide": [{"$subtract": ["$end", "$start"]}, 3600 * 1000]}},
+            "events": {"$sum": 1},
+        }},
+        {"$sort": {"_id": ASCENDING}},
+    ]
+    groups = await db.get_collection("events").aggregate(pipeline).to_list(length=None)
+    pay_periods = [{"pay_period": group["_id"], "hours": group["hours"], "events": group["events"]} for group in groups]
+    return sum(period["hours"] for period in pay_periods), pay_periods
+
+
+async def get_reoccurring_time_slots(db):
+    """
+    Returns the reoccurring time slot template as (hour, minute) pairs.
+    The template rarely changes, so it is cached for TIME_SLOTS_CACHE_SECONDS.
+    """
+    now = time.monotonic()
+    if _time_slots_cache["time_slots"] is not None and now < _time_slots_cache["expires_at"]:
+        return _time_slots_cache["time_slots"]
+
+    template = await db.get_collection("reoccurring _time_slots").find_one({"_id": TIME_SLOTS_TEMPLATE_ID})
+    if template is None:
+        coach_logger.log_warning("[!] Reoccurring time slot template not found")
+        return []
+
+    time_slots = []
+    for slot in template.get("time_slots", []):
+        slot_time = datetime.strptime(slot, "%I:%M %p")
+        time_slots.append((slot_time.hour, slot_time.minute))
+
+    _time_slots_cache.update(time_slots=time_slots, expires_at=now + TIME_SLOTS_CACHE_SECONDS)
+    return time_slots
@@ -0,0 +1,248 @@
+import asyncio
+import contextvars
+import multiprocessing
+import os
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional
+from dotenv import load_dotenv
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+from logger import coach_logger
+
+load_dotenv()
+
+
+class Job:
+    def __init__(self, job_type: str):
+        self.id = uuid.uuid4().hex
+        self.type = job_type
+        self.status = "queued"  # queued -> running -> succeeded / failed
+        self.phase = None
+        self.progress = 0.0
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+
+    @property
+    def done(self):
+        return self.status in ("succeeded", "failed")
+
+    def set_phase(self, phase: str, progress: float):
+        if self.started_at is None:
+            self.status = "running"
+            self.started_at = datetime.utcnow()
+        self.phase = phase
+        self.progress = progress
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "type": self.type,
+            "status": self.status,
+            "phase": self.phase,
+            "progress": self.progress,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+
+    @classmethod
+    def from_document(cls, document):
+        job = cls(document["type"])
+        job.id = document["_id"]
+        for field in ("status", "phase", "progress", "created_at", "started_at", "finished_at", "result", "error"):
+            setattr(job, field, document.get(field))
+        return job
+
+
+class JobConflictError(Exception):
+    def __init__(self, job_type: str, job_id: str):
+        super().__init__(f"A {job_type} job is already running: {job_id}")
+        self.job_type = job_type
+        self.job_id = job_id
+
+
+class JobStore:
+    """
+    Keeps job statuses in MongoDB so that every worker can answer a status
+    poll, not only the one that runs the job.
+
+    Exclusive jobs are stored with active: true, and a unique partial index
+    on type allows one active job per type across workers. The running
+    worker refreshes heartbeat_at, so the job of a worker that died stops
+    blocking new ones after stale_seconds.
+    """
+    def __init__(self, collection_name: str = "jobs", heartbeat_seconds: float = 5, stale_seconds: float = 60,
+                 retention_seconds: int = 7 * 24 * 3600):
+        self.collection_name = collection_name
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stale_seconds = stale_seconds
+        self.retention_seconds = retention_seconds
+
+    async def ensure_indexes(self, db):
+        collection = db[self.collection_name]
+        await collection.create_index([("type", ASCENDING)], name="active_type", unique=True, partialFilterExpression={"active": True})
+        await collection.create_index([("finished_at", ASCENDING)], name="finished_at_ttl", expireAfterSeconds=self.retention_seconds)
+
+    def _document(self, job: Job, with_result: bool = False):
+        document = job.to_dict()
+        document["_id"] = document.pop("job_id")
+        document["heartbeat_at"] = datetime.utcnow()
+        if with_result:
+            document["result"] = job.result
+        return document
+
+    async def claim(self, db, job: Job, exclusive: bool):
+        """
+        Stores a new job. Raises JobConflictError if exclusive and a job of its type is active.
+        """
+        collection = db[self.collection_name]
+        document = self._document(job)
+        if exclusive:
+            document["active"] = True
+        for _ in range(2):
+            try:
+                await collection.insert_one(document)
+                return
+            except DuplicateKeyError:
+                running = await collection.find_one({"type": job.type, "active": True})
+                if running is None:
+                    continue  # Finished in the meantime
+                if running["heartbeat_at"] >= datetime.utcnow() - timedelta(seconds=self.stale_seconds):
+                    raise JobConflictError(job.type, running["_id"])
+                coach_logger.log_warning(f"[!] {job.type} job {running['_id']} stopped sending heartbeats, marking it failed")
+                await collection.update_one(
+                    {"_id": running["_id"], "heartbeat_at": running["heartbeat_at"]},
+                    {"$set": {"status": "failed", "error": "The worker running the job stopped", "finished_at": datetime.utcnow()},
+                     "$unset": {"active": ""}}
+                )
+        raise JobConflictError(job.type, "unknown")
+
+    async def save(self, db, job: Job):
+        update = {"$set": self._document(job, with_result=job.done)}
+        if job.done:
+            update["$unset"] = {"active": ""}
+        await db[self.collection_name].update_one({"_id": job.id}, update)
+
+    async def get(self, db, job_id: str) -> Optional[Job]:
+        document = await db[self.collection_name].find_one({"_id": job_id})
+        return Job.from_document(document) if document else None
+
+
+class JobManager:
+    """
+    Runs long jobs in the background and keeps their status for polling.
+
+    CPU heavy steps are sent to a process pool through run_in_process so the
+    event loop stays free to serve other requests. Once started with a
+    database, statuses are also kept in the JobStore so they can be polled
+    from any worker, and exclusive jobs are exclusive across workers.
+    """
+    def __init__(self, max_workers: int = 1, max_jobs: int = 50, store: Optional[JobStore] = None):
+        self.max_workers = max_workers
+        self.max_jobs = max_jobs
+        self.store = store or JobStore()
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._tasks = set()
+        self._executor = None
+        self._db = None
+
+    async def start(self, db):
+        await self.store.ensure_indexes(db)
+        self._db = db
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            # Spawn so workers don't inherit the event loop and driver threads
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    async def run_in_process(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def submit(self, job_type: str, job_func, *args, exclusive: bool = False):
+        """
+        Creates a job and schedules job_func(job, *args) on the event loop.
+        With exclusive, raises JobConflictError while another job of the type is not done.
+        """
+        if exclusive:
+            running = next((job for job in self.jobs.values() if job.type == job_type and not job.done), None)
+            if running is not None:
+                raise JobConflictError(job_type, running.id)
+        job = Job(job_type)
+        if self._db is not None:
+            await self.store.claim(self._db, job, exclusive)
+        self.jobs[job.id] = job
+        self._evict_finished_jobs()
+
+        # Run in an empty context, a copy of the submitting request's would charge
+        # the job's MongoDB commands to that request's metrics and query budget
+        task = contextvars.Context().run(asyncio.create_task, self._run(job, job_func, *args))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        coach_logger.log_info(f"[+] Queued {job_type} job {job.id}")
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        job = self.jobs.get(job_id)
+        if job is None and self._db is not None:
+            job = await self.store.get(self._db, job_id)
+        return job
+
+    async def _heartbeat(self, job: Job):
+        while True:
+            await asyncio.sleep(self.store.heartbeat_seconds)
+            try:
+                await self.store.save(self._db, job)
+            except Exception as e:
+                coach_logger.log_error(f"[-] Failed to save {job.type} job {job.id}: {e}")
+
+    async def _run(self, job: Job, job_func, *args):
+        heartbeat = asyncio.create_task(self._heartbeat(job)) if self._db is not None else None
+        try:
+            job.result = await job_func(job, *args)
+            job.status = "succeeded"
+            job.progress = 1.0
+            coach_logger.log_info(f"[+] {job.type} job {job.id} finished")
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            coach_logger.log_error(f"[-] {job.type} job {job.id} failed: {e}")
+        except asyncio.CancelledError:
+            job.status = "failed"
+            job.error = "Cancelled at shutdown"
+            raise
+        finally:
+            job.finished_at = datetime.utcnow()
+            if heartbeat is not None:
+                heartbeat.cancel()
+                try:
+                    await self.store.save(self._db, job)
+                except Exception as e:
+                    coach_logger.log_error(f"[-] Failed to save {job.type} job {job.id}: {e}")
+
+    def _evict_finished_jobs(self):
+        while len(self.jobs) > self.max_jobs:
+            finished = next((job_id for job_id, job in self.jobs.items() if job.done), None)
+            if finished is None:
+                break
+            del self.jobs[finished]
+
+    def shutdown(self):
+        for task in self._tasks:
+            task.cancel()
+        if self._executor is not None:
+            coach_logger.log_info("[+] Shutting down job process pool...")
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+job_manager = JobManager(max_workers=int(os.getenv('JOB_WORKERS', 1)))
@@ -1,15 +1,106 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
 import colorlog
-import inspect
 import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Set on records that should only go to the log file
+SILENT = {"silent": True}
+QUEUE_POLICIES = ("drop", "block")
+ROTATIONS = ("size", "time", "watched", "none")
+
+
+class ConsoleFilter(logging.Filter):
+    def filter(self, record):
+        return not getattr(record, "silent", False)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "function": record.funcName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the listener thread through a bounded queue.
+
+    With the drop policy a full queue drops the record (counted in dropped),
+    so logging never blocks the caller. With block the caller waits for room.
+    """
+    def __init__(self, log_queue, policy="drop"):
+        super().__init__(log_queue)
+        self.policy = policy
+        self.dropped = 0
+
+    def enqueue(self, record):
+        if self.policy == "block":
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for room, the queue may be full when stopping
+        self.queue.put(self._sentinel)
+
+
+def build_file_handler(file_name, rotation, max_bytes, backup_count, when):
+    if rotation == "size":
+        return logging.handlers.RotatingFileHandler(file_name, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+    if rotation == "time":
+        return logging.handlers.TimedRotatingFileHandler(file_name, when=when, backupCount=backup_count, encoding='utf-8')
+    if rotation == "watched":
+        # Rotated by an external tool such as logrotate, reopened when the file is moved
+        return logging.handlers.WatchedFileHandler(file_name, encoding='utf-8')
+    return logging.FileHandler(file_name, encoding='utf-8')
+
+
+def per_process_file_name(file_name):
+    root, ext = os.path.splitext(file_name)
+    return f"{root}.{os.getpid()}{ext}"
 
 
 class Logger:
-    def __init__(self, logger_name, file_name="./logs/app.log"):
+    """
+    Application logger. Until start() is called, records only go to the
+    console, so importing the module (e.g. in the spawned job and hashing
+    workers) opens no files and starts no threads.
+
+    start() opens the log files and starts a QueueListener thread; log calls
+    then only enqueue the record and the thread formats and writes it.
+    stop() drains the queue and falls back to writing inline.
+
+    Each log file must have a single writer, size and time rotation in two
+    processes clobber each other. When running several workers either set
+    per_process (the PID is added to the file names) or use the watched
+    rotation and rotate the files externally. start() switches to per
+    process files if WEB_CONCURRENCY says there are several workers.
+    """
+    def __init__(self, logger_name, file_name="./logs/app.log", json_file_name=None, queue_size=10000, queue_policy="drop",
+                 rotation="size", max_bytes=10 * 1024 * 1024, backup_count=5, rotate_when="midnight", per_process=False):
         self.logger = logging.getLogger(logger_name)
         self.logger.setLevel(logging.DEBUG)
-        
-        formatter = colorlog.ColoredFormatter(
+
+        self.formatter = colorlog.ColoredFormatter(
             '%(asctime)s - %(name)s - %(log_color)s%(levelname)s%(reset)s - [%(module)s:%(funcName)s] - %(message)s',
             datefmt='%Y-%m-%d %H:%M:%S',
             log_colors={
@@ -20,48 +111,89 @@ class Logger:
                 'CRITICAL': 'red,bg_white',
             }
         )
-        
-        # Log to file
-        self.file_handler = logging.FileHandler(file_name, encoding='utf-8')
-        self.file_handler.setLevel(logging.DEBUG)
-        self.file_handler.setFormatter(formatter)
-        self.logger.addHandler(self.file_handler)
-        
+
+        if rotation not in ROTATIONS:
+            raise ValueError(f"Unknown log rotation {rotation}, expected one of {', '.join(ROTATIONS)}")
+        if queue_policy not in QUEUE_POLICIES:
+            raise ValueError(f"Unknown log queue policy {queue_policy}, expected one of {', '.join(QUEUE_POLICIES)}")
+        self.file_name = file_name
+        self.json_file_name = json_file_name
+        self.rotation = rotation
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.rotate_when = rotate_when
+        self.per_process = per_process
+
         # Log to console
         self.console_handler = logging.StreamHandler()
         self.console_handler.setLevel(logging.DEBUG)
-        self.console_handler.setFormatter(formatter)
+        self.console_handler.setFormatter(self.formatter)
+        self.console_handler.addFilter(ConsoleFilter())
+        self.handlers = [self.console_handler]
         self.logger.addHandler(self.console_handler)
 
-    def _get_caller_info(self):
-        stack = inspect.stack()
-        frame = stack[3]  # Changed from 2 to 3
-        module = inspect.getmodule(frame[0])
-        module_name = "" if module is None else module.__name__
-        func_name = frame.function
-        return module_name, func_name
+        self.file_handler = None
+        self.json_handler = None
+        self.queue_handler = BoundedQueueHandler(queue.Queue(maxsize=queue_size), queue_policy)
+        self.listener = None
+        self.running = False
+        atexit.register(self.stop)
 
+    def _open_files(self):
+        if not self.per_process and self.rotation in ("size", "time") and int(os.getenv('WEB_CONCURRENCY', 1)) > 1:
+            self.per_process = True
+            self.log_warning("[!] Several workers rotating one log file clobber each other, writing per process log files")
+        file_name = per_process_file_name(self.file_name) if self.per_process else self.file_name
+
+        # Log to file
+        self.file_handler = build_file_handler(file_name, self.rotation, self.max_bytes, self.backup_count, self.rotate_when)
+        self.file_handler.setLevel(logging.DEBUG)
+        self.file_handler.setFormatter(self.formatter)
+        self.handlers.append(self.file_handler)
+
+        # Log to a JSON lines file for machine parsing
+        if self.json_file_name:
+            json_file_name = per_process_file_name(self.json_file_name) if self.per_process else self.json_file_name
+            self.json_handler = build_file_handler(json_file_name, self.rotation, self.max_bytes, self.backup_count, self.rotate_when)
+            self.json_handler.setLevel(logging.DEBUG)
+            self.json_handler.setFormatter(JsonLinesFormatter())
+            self.handlers.append(self.json_handler)
+
+    def start(self):
+        """
+        Opens the log files on the first call and starts the listener thread.
+        Called by the app's lifespan and the command line entry points.
+        """
+        if self.running:
+            return
+        if self.file_handler is None:
+            self._open_files()
+        for handler in self.handlers:
+            self.logger.removeHandler(handler)
+        self.logger.addHandler(self.queue_handler)
+        self.listener = LogListener(self.queue_handler.queue, *self.handlers, respect_handler_level=True)
+        self.listener.start()
+        self.running = True
+
+    def stop(self):
+        """
+        Writes out the queued records and stops the listener thread. Later calls are written inline.
+        """
+        if not self.running:
+            return
+        self.logger.removeHandler(self.queue_handler)
+        self.listener.stop()
+        for handler in self.handlers:
+            self.logger.addHandler(handler)
+        self.running = False
+        if self.queue_handler.dropped:
+            self.log_warning(f"[!] Dropped {self.queue_handler.dropped} log records, the log queue was full")
 
     def _log(self, level, message, silent=False):
-        module_name, func_name = self._get_caller_info()
-        if silent:
-            self.logger.removeHandler(self.console_handler)
-        
-        # Create a LogRecord manually
-        record = self.logger.makeRecord(
-            self.logger.name,
-            level,
-            module_name,
-            0,  # Line number, not necessary
-            message,
-            None,
-            None,
-            func_name
-        )
-        self.logger.handle(record)
-        
-        if silent:
-            self.logger.addHandler(self.console_handler)
+        if not self.logger.isEnabledFor(level):
+            return
+        # stacklevel=3 skips _log and log_* so module/funcName are the caller's
+        self.logger.log(level, message, stacklevel=3, extra=SILENT if silent else None)
 
 
 
@@ -81,4 +213,15 @@ class Logger:
         self._log(logging.CRITICAL, message)
 
 log_file_path = os.path.join(os.path.dirname(__file__), 'Logs', 'coachify.log')
-coach_logger = Logger("coach_logger", log_file_path)
+coach_logger = Logger(
+    "coach_logger",
+    log_file_path,
+    json_file_name=os.getenv('LOG_JSON_FILE_PATH'),
+    queue_size=int(os.getenv('LOG_QUEUE_SIZE', 10000)),
+    queue_policy=os.getenv('LOG_QUEUE_POLICY', 'drop'),
+    rotation=os.getenv('LOG_ROTATION', 'size'),
+    max_bytes=int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024)),
+    backup_count=int(os.getenv('LOG_BACKUP_COUNT', 5)),
+    rotate_when=os.getenv('LOG_ROTATE_WHEN', 'midnight'),
+    per_process=os.getenv('LOG_FILE_PER_PROCESS', 'false').lower() == 'true',
+)
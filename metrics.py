@@ -0,0 +1,322 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from fastapi.routing import APIRoute
+from pymongo import monitoring
+from starlette.responses import JSONResponse
+from logger import coach_logger
+from query_profiler import QueryProfiler, query_profiler, command_shape
+
+load_dotenv()
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+# The header shows auth and DB timings to any client, so it is a debugging aid for development only
+SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', 'false').lower() == 'true'
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels, extra=()) -> str:
+    parts = [f'{name}="{escape_label(value)}"' for name, value in (*labels, *extra)]
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class MetricsRegistry:
+    """
+    Counters and histograms keyed by metric name and labels, rendered in the
+    Prometheus text format. Observations come from the event loop and from the
+    threads Motor runs commands on, so updates take a lock. Gauges are read
+    from a callback when rendering.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[tuple, float]] = {}
+        self._histograms: Dict[str, Dict[tuple, Histogram]] = {}
+        self._buckets: Dict[str, tuple] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+
+    def counter(self, name: str, help_text: str):
+        self._help[name] = ("counter", help_text)
+        self._counters.setdefault(name, {})
+
+    def histogram(self, name: str, help_text: str, buckets=LATENCY_BUCKETS):
+        self._help[name] = ("histogram", help_text)
+        self._histograms.setdefault(name, {})
+        self._buckets[name] = buckets
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], float]):
+        self._help[name] = ("gauge", help_text)
+        self._gauges[name] = read
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters[name]
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms[name]
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self._buckets[name])
+            histogram.observe(value)
+
+    def render(self) -> str:
+        lines = []
+        for name, read in self._gauges.items():
+            metric_type, help_text = self._help[name]
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}", f"{name} {read()}"]
+        with self._lock:
+            for name, series in self._counters.items():
+                metric_type, help_text = self._help[name]
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+                lines += [f"{name}{format_labels(labels)} {value}" for labels, value in series.items()]
+            for name, series in self._histograms.items():
+                metric_type, help_text = self._help[name]
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+                for labels, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{format_labels(labels, (('le', bound),))} {cumulative}")
+                    lines.append(f"{name}_bucket{format_labels(labels, (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+                    lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+registry.counter("http_requests_total", "HTTP requests by route and status.")
+registry.histogram("http_request_duration_seconds", "Time from receiving the request to sending the last body chunk.")
+registry.histogram("http_request_phase_seconds", "Time per request spent in auth, dependencies, the endpoint and serialization.")
+registry.histogram("http_request_db_roundtrips", "MongoDB commands issued per request.", buckets=COUNT_BUCKETS)
+registry.histogram("http_request_db_seconds", "Time per request spent waiting on MongoDB commands.")
+registry.histogram("mongodb_command_duration_seconds", "MongoDB command round trip time by command.")
+registry.counter("mongodb_command_failures_total", "Failed MongoDB commands by command.")
+
+
+class RequestStats:
+    """
+    Timings collected while handling one request.
+    """
+    __slots__ = ("route", "db_count", "db_seconds", "db_shapes", "phases", "endpoint_started", "endpoint_finished")
+
+    def __init__(self):
+        self.route: Optional[str] = None
+        self.db_count = 0
+        self.db_seconds = 0.0
+        self.db_shapes: List[tuple] = []  # (command, collection, filter shape), for the query profiler
+        self.phases: Dict[str, float] = {}
+        self.endpoint_started: Optional[float] = None
+        self.endpoint_finished: Optional[float] = None
+
+    def add_phase(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+
+_request_stats: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("request_stats", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+def record_phase(phase: str, seconds: float):
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.add_phase(phase, seconds)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """
+    Times every MongoDB command and charges it to the request being handled.
+
+    Motor runs commands on executor threads with a copy of the caller's
+    context, so the request's RequestStats is visible here.
+    """
+    def __init__(self, profiler: QueryProfiler = query_profiler):
+        self.profiler = profiler
+
+    def started(self, event):
+        stats = _request_stats.get()
+        if stats is not None and self.profiler.mode != "off":
+            stats.db_shapes.append(command_shape(event))
+
+    def succeeded(self, event):
+        self._record(event, failed=False)
+
+    def failed(self, event):
+        self._record(event, failed=True)
+
+    def _record(self, event, failed):
+        seconds = event.duration_micros / 1e6
+        registry.observe("mongodb_command_duration_seconds", seconds, command=event.command_name)
+        if failed:
+            registry.inc("mongodb_command_failures_total", command=event.command_name)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.db_count += 1
+            stats.db_seconds += seconds
+
+
+command_metrics = MongoCommandMetrics()
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware timing each HTTP request and recording its metrics.
+    With server_timing it also adds a Server-Timing header with the request's
+    DB and phase times, otherwise they are only visible through /api/admin/metrics.
+
+    It also checks the request's MongoDB commands against the query
+    profiler's budget. In strict mode the check runs when the response
+    starts, after the endpoint's queries, and an over budget response is
+    replaced by the 500 without buffering the body.
+    """
+    def __init__(self, app, server_timing: bool = SERVER_TIMING_ENABLED, profiler: QueryProfiler = query_profiler):
+        self.app = app
+        self.server_timing = server_timing
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        start = time.perf_counter()
+        status_code = 500
+        request = f'{scope["method"]} {scope["path"]}'
+        over_budget = False
+
+        async def send_with_timing(message):
+            nonlocal status_code, over_budget
+            if over_budget:
+                return  # The original response is replaced by the query budget error
+            if message["type"] == "http.response.start" and self.profiler.mode == "strict":
+                report = self.profiler.check(request, stats.db_count, stats.db_seconds, stats.db_shapes)
+                if report is not None:
+                    over_budget = True
+                    status_code = 500
+                    coach_logger.log_error(f"[-] Query budget exceeded: {self.profiler.describe(report)}")
+                    response = JSONResponse(status_code=500, content={"detail": "Query budget exceeded", "report": report})
+                    await response(scope, receive, send)
+                    return
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.server_timing:
+                    timings = [f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.db_count} commands"']
+                    timings += [f"{phase};dur={seconds * 1000:.1f}" for phase, seconds in stats.phases.items()]
+                    message["headers"] = list(message.get("headers", [])) + [(b"server-timing", ", ".join(timings).encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - start
+            route = stats.route or "unmatched"
+            method = scope["method"]
+            registry.inc("http_requests_total", method=method, route=route, status=str(status_code))
+            registry.observe("http_request_duration_seconds", elapsed, method=method, route=route)
+            registry.observe("http_request_db_roundtrips", stats.db_count, route=route)
+            registry.observe("http_request_db_seconds", stats.db_seconds, route=route)
+            for phase, seconds in stats.phases.items():
+                registry.observe("http_request_phase_seconds", seconds, route=route, phase=phase)
+            _request_stats.reset(token)
+            if self.profiler.mode == "log":
+                report = self.profiler.check(request, stats.db_count, stats.db_seconds, stats.db_shapes)
+                if report is not None:
+                    coach_logger.log_warning(f"[!] Query budget exceeded: {self.profiler.describe(report)}")
+
+
+def _timed_endpoint(call):
+    """
+    Wraps an endpoint to note when it starts and finishes on the request's stats.
+    """
+    if asyncio.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def timed(*args, **kwargs):
+            stats = _request_stats.get()
+            if stats is not None:
+                stats.endpoint_started = time.perf_counter()
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                if stats is not None:
+                    stats.endpoint_finished = time.perf_counter()
+    else:
+        @functools.wraps(call)
+        def timed(*args, **kwargs):
+            stats = _request_stats.get()
+            if stats is not None:
+                stats.endpoint_started = time.perf_counter()
+            try:
+                return call(*args, **kwargs)
+            finally:
+                if stats is not None:
+                    stats.endpoint_finished = time.perf_counter()
+    timed.is_timed_endpoint = True
+    return timed
+
+
+class TimedRoute(APIRoute):
+    """
+    APIRoute that labels the request with its path template and splits the
+    handler time into dependencies (auth, body parsing), the endpoint itself
+    and serialization of the response.
+    """
+    def get_route_handler(self):
+        if not getattr(self.dependant.call, "is_timed_endpoint", False):
+            self.dependant.call = _timed_endpoint(self.dependant.call)
+        handler = super().get_route_handler()
+        path_format = self.path_format
+
+        async def timed_handler(request):
+            stats = _request_stats.get()
+            if stats is None:
+                return await handler(request)
+            stats.route = path_format
+            start = time.perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                finished = time.perf_counter()
+                if stats.endpoint_started is not None:
+                    stats.add_phase("dependencies", stats.endpoint_started - start)
+                    stats.add_phase("endpoint", (stats.endpoint_finished or finished) - stats.endpoint_started)
+                    if stats.endpoint_finished is not None:
+                        stats.add_phase("serialize", finished - stats.endpoint_finished)
+                else:
+                    stats.add_phase("dependencies", finished - start)
+
+        return timed_handler
@@ -0,0 +1,113 @@
+import asyncio
+import os
+import time
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from logger import coach_logger
+from metrics import MetricsRegistry, registry
+
+load_dotenv()
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+class PasswordService:
+    """
+    Runs bcrypt hashing and verification on a bounded thread pool.
+
+    bcrypt releases the GIL, so the event loop keeps serving other requests
+    while passwords are checked. At most max_workers hashes run at once. Up to
+    max_queue more callers wait their turn. Beyond that, callers get a 503 so a
+    login storm cannot queue unbounded work.
+
+    Given a metrics registry, the queue is published on /api/admin/metrics:
+    running and waiting gauges, completed and rejected counters and a
+    histogram of the time spent waiting for a worker.
+    """
+    def __init__(self, max_workers: int = 4, max_queue: int = 100, metrics: Optional[MetricsRegistry] = None):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.metrics = metrics
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password")
+        self._semaphore = asyncio.Semaphore(max_workers)
+        self._waiting = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+        if metrics is not None:
+            metrics.gauge("password_hash_running", "bcrypt operations running on the password pool.", lambda: self._running)
+            metrics.gauge("password_hash_waiting", "bcrypt operations waiting for a password pool worker.", lambda: self._waiting)
+            metrics.counter("password_hash_completed_total", "bcrypt operations completed.")
+            metrics.counter("password_hash_rejected_total", "bcrypt operations rejected with a 503, the queue was full.")
+            metrics.histogram("password_hash_wait_seconds", "Time bcrypt operations waited for a password pool worker.")
+            # Start the counters at 0 so they are rendered before the first login
+            metrics.inc("password_hash_completed_total", 0)
+            metrics.inc("password_hash_rejected_total", 0)
+
+    async def _run(self, func, *args):
+        if self._waiting >= self.max_queue:
+            self._rejected += 1
+            if self.metrics is not None:
+                self.metrics.inc("password_hash_rejected_total")
+            coach_logger.log_warning(f"[!] Password queue full ({self._waiting} waiting), rejecting request")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many sign in attempts, try again shortly",
+                headers={"Retry-After": "1"}
+            )
+
+        queued_at = time.perf_counter()
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+
+        wait = time.perf_counter() - queued_at
+        self._total_wait += wait
+        self._max_wait = max(self._max_wait, wait)
+        if self.metrics is not None:
+            self.metrics.observe("password_hash_wait_seconds", wait)
+        self._running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self._running -= 1
+            self._completed += 1
+            self._semaphore.release()
+            if self.metrics is not None:
+                self.metrics.inc("password_hash_completed_total")
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(pwd_context.verify, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(pwd_context.hash, password)
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "running": self._running,
+            "waiting": self._waiting,
+            "completed": self._completed,
+            "rejected": self._rejected,
+            "avg_wait_seconds": self._total_wait / self._completed if self._completed else 0.0,
+            "max_wait_seconds": self._max_wait,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_service = PasswordService(
+    max_workers=int(os.getenv('PASSWORD_WORKERS', min(4, os.cpu_count() or 1))),
+    max_queue=int(os.getenv('PASSWORD_MAX_QUEUE', 100)),
+    metrics=registry,
+)
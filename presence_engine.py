@@ -0,0 +1,151 @@
+import asyncio
+import heapq
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+from bson import ObjectId
+from dotenv import load_dotenv
+from logger import coach_logger
+from user_cache import user_cache
+from websocket_manager import manager
+
+load_dotenv()
+
+
+class PresenceEngine:
+    """
+    Tracks which users are active from their request activity.
+
+    Each active user has an expiry deadline (last activity + timeout) kept in a
+    min-heap. Touching a user only moves the deadline in a dict; the heap entry
+    is re-armed lazily when it reaches the top. Every tick the expired users are
+    marked inactive with one update_many and announced in a batch broadcast.
+    """
+    def __init__(self, timeout: float = 300, tick_interval: float = 1.0):
+        self.timeout = timeout
+        self.tick_interval = tick_interval
+        self._deadlines: Dict[str, float] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._task = None
+
+    def is_active(self, user_id: str) -> bool:
+        return user_id in self._deadlines
+
+    def touch(self, user_id: str, when: float = None):
+        deadline = (when if when is not None else time.time()) + self.timeout
+        current = self._deadlines.get(user_id)
+        if current is None:
+            heapq.heappush(self._heap, (deadline, user_id))
+            self._deadlines[user_id] = deadline
+        elif deadline > current:
+            self._deadlines[user_id] = deadline
+
+    def pop_expired(self, now: float = None) -> List[str]:
+        now = now if now is not None else time.time()
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            _, user_id = heapq.heappop(self._heap)
+            deadline = self._deadlines.get(user_id)
+            if deadline is None:
+                continue
+            if deadline > now:
+                # Touched since this entry was pushed, re-arm with the latest deadline
+                heapq.heappush(self._heap, (deadline, user_id))
+                continue
+            del self._deadlines[user_id]
+            expired.append(user_id)
+        return expired
+
+    async def tick(self, db):
+        expired = self.pop_expired()
+        if not expired:
+            return
+
+        try:
+            expired = await self._mark_inactive(db, expired)
+        except Exception:
+            # Their deadlines are gone, re-arm them to expire again on the next tick
+            now = time.time()
+            for user_id in expired:
+                self.touch(user_id, now - self.timeout)
+            raise
+        if not expired:
+            return
+
+        coach_logger.log_info(f"[+] Marked {len(expired)} users as inactive.")
+        # Admin dashboards only handle user_status_update, keep sending it per user
+        # next to the batch message until they read user_status_batch_update
+        for user_id in expired:
+            await manager.broadcast({"message": "user_status_update", "user_id": user_id, "isActive": False})
+        await manager.broadcast({
+            "message": "user_status_batch_update",
+            "updates": [{"user_id": user_id, "isActive": False} for user_id in expired]
+        })
+
+    async def _mark_inactive(self, db, expired: List[str]) -> List[str]:
+        """
+        Marks the expired users inactive, except those still active on another worker. Returns the users marked.
+        """
+        # With several workers a user may still be active on another one, whose
+        # activity tracker keeps last_request_at current
+        cutoff = datetime.utcnow() - timedelta(seconds=self.timeout)
+        active_elsewhere = await db.users.find(
+            {"_id": {"$in": [ObjectId(user_id) for user_id in expired]}, "last_request_at": {"$gte": cutoff}},
+            {"last_request_at": 1}
+        ).to_list(None)
+        for user in active_elsewhere:
+            self.touch(str(user["_id"]), user["last_request_at"].replace(tzinfo=timezone.utc).timestamp())
+        if active_elsewhere:
+            expired = [user_id for user_id in expired if not self.is_active(user_id)]
+            if not expired:
+                return expired
+
+        for user_id in expired:
+            user_cache.invalidate(user_id)
+        await db.users.update_many(
+            {"_id": {"$in": [ObjectId(user_id) for user_id in expired]}, "isActive": True},
+            {"$set": {"isActive": False}}
+        )
+        return expired
+
+    async def seed(self, db):
+        """
+        Starts tracking the users the database still marks as active, for example after a restart.
+        """
+        active_users = await db.users.find({"isActive": True}, {"last_request_at": 1}).to_list(None)
+        now = time.time()
+        for user in active_users:
+            last_request_at = user.get("last_request_at")
+            # last_request_at is a naive UTC datetime
+            when = last_request_at.replace(tzinfo=timezone.utc).timestamp() if last_request_at else now - self.timeout
+            self.touch(str(user["_id"]), when)
+        coach_logger.log_info(f"[+] Tracking presence of {len(active_users)} active users")
+
+    async def _run(self, db):
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            try:
+                await self.tick(db)
+            except Exception as e:
+                coach_logger.log_error(f"[-] Presence tick failed: {e}")
+
+    async def start(self, db):
+        if self._task is None:
+            await self.seed(db)
+            self._task = asyncio.create_task(self._run(db))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+presence_engine = PresenceEngine(
+    timeout=float(os.getenv('PRESENCE_TIMEOUT_SECONDS', 300)),
+    tick_interval=float(os.getenv('PRESENCE_TICK_SECONDS', 1)),
+)
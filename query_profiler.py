@@ -0,0 +1,104 @@
+import json
+import os
+from collections import Counter
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROFILER_MODES = ("off", "log", "strict")
+# Where each command keeps the filter that decides which documents it touches
+FILTER_FIELDS = {"find": "filter", "count": "query", "distinct": "query", "findAndModify": "query"}
+
+
+def filter_shape(value):
+    """
+    Replaces the values of a filter with ? so queries that only differ by their
+    values group together, e.g. {"coach_id": "?", "start": {"$gte": "?"}}.
+    """
+    if isinstance(value, dict):
+        return {key: filter_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return ["?"] if value else []
+    return "?"
+
+
+def command_filter(command_name: str, command) -> Optional[dict]:
+    if command_name in FILTER_FIELDS:
+        return command.get(FILTER_FIELDS[command_name])
+    if command_name == "aggregate":
+        pipeline = command.get("pipeline") or [{}]
+        return pipeline[0].get("$match")
+    if command_name in ("update", "delete"):
+        statements = command.get(f"{command_name}s") or [{}]
+        return statements[0].get("q")
+    return None
+
+
+def command_shape(event) -> tuple:
+    """
+    (command, collection, filter shape) of a pymongo CommandStartedEvent.
+    """
+    collection = event.command.get(event.command_name)
+    shape = command_filter(event.command_name, event.command)
+    return (
+        event.command_name,
+        collection if isinstance(collection, str) else "",
+        json.dumps(filter_shape(shape), sort_keys=True) if shape is not None else "",
+    )
+
+
+class QueryProfiler:
+    """
+    Budget for the MongoDB commands a request may issue. The commands are
+    counted and timed on the request's RequestStats by the metrics listener,
+    which also records their shapes unless the profiler is off, and
+    MetricsMiddleware checks them against the budget.
+
+    In log mode a request over budget is logged as a warning. In strict mode
+    (meant for development) it fails with a 500 carrying the report, so N+1
+    queries are noticed before they ship.
+    """
+    def __init__(self, mode: str = "log", max_commands: int = 20, max_db_ms: float = 500):
+        if mode not in PROFILER_MODES:
+            raise ValueError(f"Unknown query profiler mode {mode}, expected one of {', '.join(PROFILER_MODES)}")
+        self.mode = mode
+        self.max_commands = max_commands
+        self.max_db_ms = max_db_ms
+
+    def check(self, request: str, command_count: int, db_seconds: float, shapes: List[tuple]) -> Optional[Dict]:
+        """
+        Returns a report of the request's commands if it went over budget, else None.
+        """
+        db_ms = db_seconds * 1000
+        if command_count <= self.max_commands and db_ms <= self.max_db_ms:
+            return None
+        return {
+            "request": request,
+            "commands": command_count,
+            "max_commands": self.max_commands,
+            "db_ms": round(db_ms, 1),
+            "max_db_ms": self.max_db_ms,
+            "shapes": [
+                {"count": count, "command": command, "collection": collection, "filter": shape}
+                for (command, collection, shape), count in Counter(shapes).most_common()
+            ],
+        }
+
+    @staticmethod
+    def describe(report: Dict) -> str:
+        shapes = "; ".join(
+            f"{shape['count']}x {shape['command']} {shape['collection']} {shape['filter']}".rstrip()
+            for shape in report["shapes"]
+        )
+        return (
+            f"{report['request']} issued {report['commands']} MongoDB commands (budget {report['max_commands']}) "
+            f"taking {report['db_ms']} ms (budget {report['max_db_ms']} ms): {shapes}"
+        )
+
+
+query_profiler = QueryProfiler(
+    mode=os.getenv('QUERY_PROFILER_MODE', 'log'),
+    max_commands=int(os.getenv('QUERY_BUDGET_COMMANDS', 20)),
+    max_db_ms=float(os.getenv('QUERY_BUDGET_DB_MS', 500)),
+)
@@ -0,0 +1,86 @@
+import os
+import secrets
+from datetime import datetime
+from dotenv import load_dotenv
+from pymongo import ASCENDING, ReturnDocument
+from logger import coach_logger
+
+load_dotenv()
+
+
+def new_jti() -> str:
+    return secrets.token_urlsafe(12)
+
+
+class TokenStore:
+    """
+    Refresh token bookkeeping in the tokens collection.
+
+    Each session (token family) is one document keyed by the current refresh
+    token's jti. Rotating swaps the jti in place with a single
+    find_one_and_update, so the collection holds one document per live session.
+    A TTL index on expires_at removes expired sessions.
+
+    The session also keeps the last rotated_history jtis it rotated out, so any
+    worker can tell a replayed token from an expired one: replaying a rotated
+    out token revokes its whole family.
+    """
+    def __init__(self, rotated_history: int = 100):
+        self.rotated_history = rotated_history
+
+    async def ensure_indexes(self, db):
+        coach_logger.log_info("[+] Ensuring tokens indexes...")
+        # Partial so tokens stored before jti existed do not collide on null
+        await db.tokens.create_index(
+            [("jti", ASCENDING)], name="jti", unique=True,
+            partialFilterExpression={"jti": {"$exists": True}}
+        )
+        await db.tokens.create_index([("family", ASCENDING)], name="family")
+        await db.tokens.create_index([("rotated_jtis", ASCENDING)], name="rotated_jtis")
+        await db.tokens.create_index([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0)
+
+    async def issue(self, db, jti: str, family: str, user_id: str, email: str, expires_at: datetime):
+        await db.tokens.insert_one({
+            "jti": jti,
+            "family": family,
+            "user_id": user_id,
+            "user_email": email,
+            "expires_at": expires_at,
+        })
+
+    async def rotate(self, db, jti: str, next_jti: str, expires_at: datetime):
+        """
+        Atomically replaces jti with next_jti if it is still current. Returns the
+        session document, or None when the token was already used, revoked or expired.
+        """
+        session = await db.tokens.find_one_and_update(
+            {"jti": jti, "expires_at": {"$gt": datetime.utcnow()}},
+            {
+                "$set": {"jti": next_jti, "expires_at": expires_at},
+                "$push": {"rotated_jtis": {"$each": [jti], "$slice": -self.rotated_history}},
+            },
+            projection={"user_id": 1, "family": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if session is not None:
+            return session
+
+        reused = await db.tokens.find_one({"rotated_jtis": jti}, {"family": 1})
+        if reused is not None:
+            family = reused["family"]
+            result = await db.tokens.delete_many({"family": family})
+            coach_logger.log_warning(f"[!] Refresh token {jti} was reused, revoked {result.deleted_count} sessions of family {family}")
+        return None
+
+    async def revoke(self, db, jti: str) -> bool:
+        result = await db.tokens.delete_one({"jti": jti})
+        return result.deleted_count > 0
+
+    async def revoke_legacy(self, db, refresh_token: str):
+        """
+        Removes a refresh token stored before tokens carried a jti. Returns the removed document.
+        """
+        return await db.tokens.find_one_and_delete({"refresh_token": refresh_token})
+
+
+token_store = TokenStore(rotated_history=int(os.getenv('TOKEN_ROTATED_HISTORY', 100)))
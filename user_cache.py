@@ -0,0 +1,68 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class UserCache:
+    """
+    Bounded LRU cache of resolved users keyed by user id.
+
+    Entries expire after ttl_seconds so changes made by other workers or
+    scripts are picked up. Routes that change a user call invalidate().
+
+    The cache keeps its own copy of each user and get() hands out copies, so
+    handlers changing the user they got don't change the cache, and update()
+    replaces the entry instead of changing users in flight.
+    """
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 60):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return user.model_copy()
+
+    def set(self, user_id: str, user):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl_seconds, user.model_copy())
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def update(self, user_id: str, **fields):
+        """
+        Applies a change already written to the database to the cached user, if any.
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                expires_at, user = entry
+                self._entries[user_id] = (expires_at, user.model_copy(update=fields))
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache(
+    max_size=int(os.getenv('USER_CACHE_SIZE', 1024)),
+    ttl_seconds=float(os.getenv('USER_CACHE_TTL_SECONDS', 60)),
+)
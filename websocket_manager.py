@@ -1,26 +1,111 @@
 from fastapi import Depends, HTTPException, status, Query, APIRouter, Body, Response, Request, File, UploadFile, WebSocket, WebSocketDisconnect
+from starlette.status import WS_1013_TRY_AGAIN_LATER
 from logger import coach_logger
+from ws_backplane import InProcessBackplane
 from typing import Optional, Union, List, Dict
+from dotenv import load_dotenv
+import asyncio
 import json
+import os
+
+load_dotenv()
+
+
+class ClientConnection:
+    """
+    A connected WebSocket with its own bounded send queue, drained by a writer task.
+    """
+    def __init__(self, websocket: WebSocket, max_queue: int):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.writer: Optional[asyncio.Task] = None
 
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    """
+    Fans broadcasts out to the connected admin dashboards without waiting on them.
+
+    broadcast() serializes the message once and only enqueues it, so the caller
+    (a login for example) never waits on a socket. Each connection's writer task
+    sends its queue in order. A client whose queue fills up, or whose send fails
+    or takes longer than send_timeout, is evicted and closed.
+
+    Broadcasts go through a backplane so that, with several workers, the admins
+    connected to the other workers receive them too (see ws_backplane).
+    """
+    def __init__(self, max_queue: int = 1000, send_timeout: float = 5.0):
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.active_connections: Dict[WebSocket, ClientConnection] = {}
+        self.backplane = InProcessBackplane()
+        self.backplane.bind(self._deliver_local)
+
+    async def use_backplane(self, backplane):
+        await self.backplane.stop()
+        backplane.bind(self._deliver_local)
+        await backplane.start()
+        self.backplane = backplane
 
     async def connect(self, websocket: WebSocket):
         # await websocket.accept()
         coach_logger.log_info("[+] New connection established.")
-        self.active_connections.append(websocket)
+        connection = ClientConnection(websocket, self.max_queue)
+        connection.writer = asyncio.create_task(self._write(connection))
+        self.active_connections[websocket] = connection
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        connection = self.active_connections.pop(websocket, None)
+        if connection is not None and connection.writer is not None and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
 
-    async def broadcast(self, message: str):
+    async def broadcast(self, message: dict):
+        message_text = json.dumps(message)  # Serialized once for every connection and worker
+        await self.backplane.publish(message_text)
+        # Let the writers run so a burst of broadcasts does not fill healthy queues
+        await asyncio.sleep(0)
+
+    def _deliver_local(self, message_text: str):
         if len(self.active_connections) > 0:
             coach_logger.log_info(f"[+] Broadcasting message to {len(self.active_connections)} connections.")
-            message_text = json.dumps(message)  # Convert the message dict to a JSON string
-            for connection in self.active_connections:
-                await connection.send_text(message_text)
+            for connection in list(self.active_connections.values()):
+                try:
+                    connection.queue.put_nowait(message_text)
+                except asyncio.QueueFull:
+                    self._evict(connection, f"send queue full ({self.max_queue} messages)")
+
+    async def _write(self, connection: ClientConnection):
+        try:
+            while True:
+                message_text = await connection.queue.get()
+                await asyncio.wait_for(connection.websocket.send_text(message_text), self.send_timeout)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self._evict(connection, f"send took longer than {self.send_timeout}s")
+        except Exception as e:
+            self._evict(connection, f"send failed: {e}")
+
+    def _evict(self, connection: ClientConnection, reason: str):
+        if self.active_connections.get(connection.websocket) is not connection:
+            return
+        coach_logger.log_warning(f"[!] Evicting WebSocket client, {reason}")
+        self.disconnect(connection.websocket)
+        asyncio.create_task(self._close(connection.websocket))
+
+    async def _close(self, websocket: WebSocket):
+        try:
+            await asyncio.wait_for(websocket.close(code=WS_1013_TRY_AGAIN_LATER), self.send_timeout)
+        except Exception:
+            pass  # The client is gone or stuck either way
+
+    async def close_all(self):
+        await self.backplane.stop()
+        for websocket in list(self.active_connections):
+            self.disconnect(websocket)
+            await self._close(websocket)
+
 
-manager = ConnectionManager()
+manager = ConnectionManager(
+    max_queue=int(os.getenv('WS_SEND_QUEUE_SIZE', 1000)),
+    send_timeout=float(os.getenv('WS_SEND_TIMEOUT_SECONDS', 5)),
+)
@@ -0,0 +1,132 @@
+import asyncio
+import os
+import secrets
+import socket
+from datetime import datetime
+from typing import Callable, Optional
+from dotenv import load_dotenv
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+from logger import coach_logger
+
+load_dotenv()
+
+BACKPLANES = ('memory', 'mongodb')
+MAX_RECONNECT_DELAY = 60
+
+
+class InProcessBackplane:
+    """
+    Delivers broadcasts to this process's connections only. Enough for a single worker.
+    """
+    def __init__(self):
+        self._deliver: Optional[Callable[[str], None]] = None
+
+    def bind(self, deliver: Callable[[str], None]):
+        self._deliver = deliver
+
+    async def start(self):
+        pass
+
+    async def publish(self, message_text: str):
+        self._deliver(message_text)
+
+    async def stop(self):
+        pass
+
+
+class MongoChangeStreamBackplane(InProcessBackplane):
+    """
+    Shares broadcasts between workers through a MongoDB collection.
+
+    A broadcast is delivered locally right away and inserted into the
+    collection by a background publisher, batching whatever queued up in the
+    meantime. Every worker watches the collection with a change stream and
+    delivers the inserts of the other workers. Documents expire after
+    retention_seconds. Change streams need a replica set (Atlas, or a local
+    mongod started with --replSet); start() fails on a standalone mongod.
+    """
+    def __init__(self, db, collection_name: str = "ws_broadcasts", retention_seconds: int = 60):
+        super().__init__()
+        self.collection = db.get_collection(collection_name)
+        self.retention_seconds = retention_seconds
+        self.origin = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}"
+        self._outbox: asyncio.Queue = asyncio.Queue()
+        self._pipeline = [{"$match": {"operationType": "insert", "fullDocument.origin": {"$ne": self.origin}}}]
+        self._tasks = []
+
+    async def start(self):
+        await self.collection.create_index([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=self.retention_seconds)
+        resume_token = await self._probe()
+        self._tasks = [asyncio.create_task(self._publish_outbox()), asyncio.create_task(self._listen(resume_token))]
+        coach_logger.log_info(f"[+] WebSocket broadcasts shared through {self.collection.name} as {self.origin}")
+
+    async def publish(self, message_text: str):
+        self._deliver(message_text)
+        self._outbox.put_nowait(message_text)
+
+    async def _publish_outbox(self):
+        while True:
+            messages = [await self._outbox.get()]
+            while not self._outbox.empty():
+                messages.append(self._outbox.get_nowait())
+            now = datetime.utcnow()
+            try:
+                await self.collection.insert_many(
+                    [{"origin": self.origin, "payload": message_text, "created_at": now} for message_text in messages],
+                    ordered=True
+                )
+            except Exception as e:
+                coach_logger.log_error(f"[-] Failed to share {len(messages)} broadcasts with other workers: {e}")
+
+    async def _probe(self):
+        """
+        Opens the change stream once so a deployment without change streams
+        fails at startup. Returns the resume token the listener starts from.
+        """
+        try:
+            async with self.collection.watch(self._pipeline) as stream:
+                await stream.try_next()
+                return stream.resume_token
+        except OperationFailure as e:
+            raise RuntimeError(
+                f"WS_BACKPLANE=mongodb needs change streams, run MongoDB as a replica set or use WS_BACKPLANE=memory: {e}"
+            ) from e
+
+    async def _listen(self, resume_token=None):
+        delay = 1
+        failing = False
+        while True:
+            try:
+                async with self.collection.watch(self._pipeline, resume_after=resume_token) as stream:
+                    while stream.alive:
+                        change = await stream.try_next()
+                        resume_token = stream.resume_token
+                        if failing:
+                            coach_logger.log_info("[+] Broadcast change stream reconnected")
+                            delay, failing = 1, False
+                        if change is not None:
+                            self._deliver(change["fullDocument"]["payload"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Logged once per outage, retries back off up to MAX_RECONNECT_DELAY
+                if not failing:
+                    coach_logger.log_error(f"[-] Broadcast change stream failed, reconnecting: {e}")
+                    failing = True
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+def create_backplane(name: str, db=None):
+    if name == 'memory':
+        return InProcessBackplane()
+    if name == 'mongodb':
+        return MongoChangeStreamBackplane(db)
+    raise ValueError(f"Unknown WebSocket backplane {name}, expected one of {', '.join(BACKPLANES)}")